@@ -0,0 +1,90 @@
+import pygame
+import os
+import sys
+import io
+from assets import ASSET_NAMES, image_to_bytes
+from container import write_container_header, open_container
+
+ARCHIVE_PATH = os.path.join("Assets", "assets.pak")
+ARCHIVE_MAGIC = b"ACPACK01"
+
+
+def pack_assets(path=ARCHIVE_PATH, raw=False, asset_paths=None):
+    """Pack the images into one archive file
+
+    The file is a container with the JSON index of the images in its header and the images after it, every one
+    starting 4 byte aligned. The images are stored as their image files or (raw=True) as their decoded RGB or RGBA pixels,
+    which are larger but need no decoding at all.
+    """
+    asset_paths = sorted(ASSET_NAMES if asset_paths is None else asset_paths)
+    blobs, index = [], {}
+    for asset_path in asset_paths:
+        stat = os.stat(asset_path)
+        entry = {"source": [stat.st_size, int(stat.st_mtime)]}
+        if raw:
+            surface = pygame.image.load(asset_path)
+            pixel_format = "RGBA" if surface.get_flags() & pygame.SRCALPHA else "RGB"
+            blob = image_to_bytes(surface, pixel_format)
+            entry.update({"format": pixel_format, "size": list(surface.get_size())})
+        else:
+            with open(asset_path, "rb") as asset_file:
+                blob = asset_file.read()
+            entry["format"] = "file"
+        blobs.append(blob)
+        index[asset_path.replace(os.sep, "/")] = entry
+
+    # the offsets are relative to the end of the header, so the index does not depend on its own length:
+    offset = 0
+    for asset_path, blob in zip(asset_paths, blobs):
+        index[asset_path.replace(os.sep, "/")].update({"offset": offset, "length": len(blob)})
+        offset += len(blob) + (-len(blob) % 4)
+    with open(path, "wb") as archive_file:
+        write_container_header(archive_file, ARCHIVE_MAGIC, index)
+        for blob in blobs:
+            archive_file.write(blob + b"\0" * (-len(blob) % 4))
+    return len(index), os.path.getsize(path)
+
+
+class AssetArchive:
+    """Memory mapped asset archive, the images are built from the mapped memory without opening any other file"""
+
+    def __init__(self, path=ARCHIVE_PATH):
+        self.map, self.index, self.data_start = open_container(path, ARCHIVE_MAGIC)
+
+    def __contains__(self, asset_path):
+        return asset_path.replace(os.sep, "/") in self.index
+
+    def is_current(self):
+        """Check if the packed images are the same as the image files (the ones which are still there)"""
+        for asset_path, entry in self.index.items():
+            if os.path.exists(asset_path):
+                stat = os.stat(asset_path)
+                if [stat.st_size, int(stat.st_mtime)] != entry["source"]:
+                    return False
+        return True
+
+    def load(self, asset_path):
+        """Surface of a packed image, the raw pixels are used in place (the surface shares the mapped memory)"""
+        entry = self.index[asset_path.replace(os.sep, "/")]
+        start = self.data_start + entry["offset"]
+        data = memoryview(self.map)[start:start + entry["length"]]
+        if entry["format"] == "file":
+            return pygame.image.load(io.BytesIO(data), os.path.basename(asset_path))
+        return pygame.image.frombuffer(data, entry["size"], entry["format"])
+
+
+def open_archive(path=ARCHIVE_PATH):
+    """The asset archive if there is an up-to-date one (None otherwise)"""
+    if not os.path.exists(path):
+        return None
+    try:
+        archive = AssetArchive(path)
+    except ValueError:
+        return None
+    return archive if archive.is_current() else None
+
+
+if __name__ == '__main__':
+    # python archive.py [--raw]
+    image_count, archive_bytes = pack_assets(raw="--raw" in sys.argv[1:])
+    print("Packed {} images into {} ({} bytes)".format(image_count, ARCHIVE_PATH, archive_bytes))
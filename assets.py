@@ -0,0 +1,123 @@
+import pygame
+import time
+import game_config
+
+# the images of game_config by their paths (the handles of the images) -> their names in game_config:
+ASSET_NAMES = {path: name for name, path in vars(game_config).items()
+               if isinstance(path, str) and path.lower().endswith((".png", ".jpg"))}
+
+# pygame.image.tobytes and the BGRA pixel format (the pixel order of the display) are new in pygame 2.1.3, the older
+# versions (e.g. 2.0.1 in Pipfile.lock) only have tostring and RGBA:
+BGRA_SUPPORTED = pygame.version.vernum >= (2, 1, 3)
+image_to_bytes = pygame.image.tobytes if BGRA_SUPPORTED else pygame.image.tostring
+
+# assets which are blitted as they are (not scaled or rotated), these are worth to be run length encoded:
+RLE_ASSETS = [game_config.WALL_1, game_config.WALL_2, game_config.WALL_3, game_config.WALL_4, game_config.BRIDGE]
+
+
+class AssetManager:
+    """Images loaded on first use, converted to the display format once there is a display, and reference counted
+
+    The game refers to the images by their paths. The users of a set of images (e.g. a level) acquire them and
+    release them when they are done, an image is unloaded when nobody uses it anymore. The load (and conversion)
+    time of every image is recorded.
+    """
+
+    def __init__(self, rle_assets=RLE_ASSETS):
+        self.rle_assets = set(rle_assets)
+        self.surfaces = {}  # path -> loaded surface
+        self.display_surfaces = {}  # path -> the surface converted to the display format
+        self.references = {}  # path -> number of users
+        self.load_times = {}  # path -> seconds spent on loading and converting
+        self.unload_hooks = []  # called with the path of every unloaded image (e.g. to drop its transformed copies)
+        self.archive = None  # packed images (archive.AssetArchive), used instead of the image files if it is set
+
+    def get(self, path):
+        """The loaded image (loading it now if this is the first use)"""
+        surface = self.surfaces.get(path)
+        if surface is None:
+            start_time = time.perf_counter()
+            if self.archive is not None and path in self.archive:
+                surface = self.archive.load(path)
+            else:
+                surface = pygame.image.load(path)
+            self.surfaces[path] = surface
+            self.load_times[path] = self.load_times.get(path, 0) + time.perf_counter() - start_time
+        return surface
+
+    def display(self, path):
+        """The display format version of an image (the loaded image itself if there is no display yet)
+
+        Opaque images are converted with convert(), images with per pixel alpha with convert_alpha().
+        """
+        converted = self.display_surfaces.get(path)
+        if converted is not None:
+            return converted
+        surface = self.get(path)
+        if pygame.display.get_surface() is None:
+            return surface
+        start_time = time.perf_counter()
+        if surface.get_flags() & pygame.SRCALPHA:
+            converted = surface.convert_alpha()
+            if path in self.rle_assets:
+                converted.set_alpha(255, pygame.RLEACCEL)
+        else:
+            converted = surface.convert()
+        self.display_surfaces[path] = converted
+        self.load_times[path] += time.perf_counter() - start_time
+        return converted
+
+    def acquire(self, paths):
+        """Register a user of the images (they are still loaded on first use)"""
+        for path in paths:
+            self.references[path] = self.references.get(path, 0) + 1
+
+    def release(self, paths):
+        """Unregister a user of the images, the ones without users are unloaded"""
+        for path in paths:
+            self.references[path] -= 1
+            if self.references[path] == 0:
+                del self.references[path]
+                self.unload(path)
+
+    def unload(self, path):
+        """Drop an image (it is loaded again if it is used later)"""
+        self.surfaces.pop(path, None)
+        self.display_surfaces.pop(path, None)
+        for hook in self.unload_hooks:
+            hook(path)
+
+    def report(self):
+        """Name, size in bytes and load time in seconds of every loaded image"""
+        report = []
+        for path, surface in self.surfaces.items():
+            surface = self.display_surfaces.get(path, surface)
+            report.append((ASSET_NAMES.get(path, path), surface.get_height() * surface.get_pitch(),
+                           self.load_times[path]))
+        return report
+
+
+ASSETS = AssetManager()
+
+
+def display_format(surface):
+    """The display format version of an image (given by its path), other surfaces are returned as they are"""
+    return ASSETS.display(surface) if isinstance(surface, str) else surface
+
+
+def format_asset_report(report):
+    """Format the report of AssetManager.report as a table"""
+    lines = ["{:<15}{:>12}{:>12}".format("asset", "bytes", "ms")]
+    for name, size, seconds in report:
+        lines.append("{:<15}{:>12}{:>12.3f}".format(name, size, seconds * 1000))
+    lines.append("{:<15}{:>12}{:>12.3f}".format("total", sum(row[1] for row in report),
+                                                 sum(row[2] for row in report) * 1000))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    pygame.init()
+    pygame.display.set_mode((game_config.WIDTH, game_config.HEIGHT), pygame.HIDDEN)
+    for asset_path in ASSET_NAMES:
+        display_format(asset_path)
+    print(format_asset_report(ASSETS.report()))
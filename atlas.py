@@ -0,0 +1,99 @@
+import pygame
+import numpy as np
+import os
+import game_config
+from assets import ASSET_NAMES, BGRA_SUPPORTED, image_to_bytes
+from container import write_container_header, open_container
+from utils import reshape_and_rotate
+
+ATLAS_PATH = os.path.join("Assets", "sprite_atlas.bin")
+ATLAS_MAGIC = b"ACATLAS1"
+ATLAS_WIDTH = 4096
+# the frames are stored in the pixel order of the display if this pygame version can read it (no conversion needed):
+ATLAS_FORMAT = "BGRA" if BGRA_SUPPORTED else "RGBA"
+
+# (asset names, size, rotations) of the frames to bake, only these angles can ever appear in the game:
+ATLAS_SPRITES = [
+    # the player starts at 90 degrees and rotates with 4 degree steps:
+    (["PLAYER_RIGHT", "PLAYER_LEFT", "PLAYER_STAND"], 35, range(2, 360, 4)),
+    # the hiding arrow is drawn at the player rotation - 90:
+    (["ARROW"], 35, range(0, 360, 4)),
+    # guards stand at multiples of 90 degrees and walking guards rotate with 3 degree steps:
+    (["GUARD_RIGHT", "GUARD_LEFT", "GUARD_STAND", "GUARD_DEAD"], 35, range(0, 360, 3)),
+    (["VIEW_RANGE"], 35 * 8, range(0, 360, 3)),
+]
+
+
+def assets_signature():
+    """Size and modification time of the source images, a baked atlas is only valid if these did not change"""
+    signature = {}
+    for path in sorted(ASSET_NAMES):  # only the images (not e.g. the caches next to them)
+        if os.path.exists(path):  # the images may only be in the asset archive
+            stat = os.stat(path)
+            signature[os.path.basename(path)] = [stat.st_size, int(stat.st_mtime)]
+    return signature
+
+
+def bake_atlas(path=ATLAS_PATH, sprites=ATLAS_SPRITES):
+    """Bake the pre-scaled and pre-rotated frames into one atlas file
+
+    The file is a container with the JSON index of the frames in its header and the BGRA (or RGBA) pixels of the
+    atlas after it. The frames are packed in rows (shelves) from the top left corner.
+    """
+    frames, index = [], []
+    x, y, row_height = 0, 0, 0
+    for names, size, rotations in sprites:
+        for name in names:
+            for rotation in rotations:
+                frame = reshape_and_rotate(getattr(game_config, name), size, rotation)
+                width, height = frame.get_size()
+                if x + width > ATLAS_WIDTH:
+                    x, y, row_height = 0, y + row_height, 0
+                frames.append((frame, x, y))
+                index.append({"asset": name, "size": size, "rotation": rotation, "rect": [x, y, width, height]})
+                x, row_height = x + width, max(row_height, height)
+    atlas_height = y + row_height
+
+    pixels = np.zeros((atlas_height, ATLAS_WIDTH, 4), dtype=np.uint8)
+    for frame, x, y in frames:
+        width, height = frame.get_size()
+        pixels[y:y + height, x:x + width] = np.frombuffer(image_to_bytes(frame, ATLAS_FORMAT),
+                                                          dtype=np.uint8).reshape(height, width, 4)
+
+    with open(path, "wb") as atlas_file:
+        write_container_header(atlas_file, ATLAS_MAGIC, {"width": ATLAS_WIDTH, "height": atlas_height,
+                                                         "format": ATLAS_FORMAT, "sources": assets_signature(),
+                                                         "frames": index})
+        atlas_file.write(pixels.tobytes())
+    return len(index), os.path.getsize(path)
+
+
+def load_atlas(path=ATLAS_PATH):
+    """Memory map a baked atlas and return its frames as {(image path, size, rotation): subsurface}
+
+    Returns an empty dictionary if there is no atlas or it was baked from different images (or in the pixel format
+    of another pygame version).
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        atlas_map, index, pixels_start = open_container(path, ATLAS_MAGIC)
+    except ValueError:
+        return {}
+    if index["sources"] != assets_signature() or index.get("format") != ATLAS_FORMAT:
+        return {}
+    # the surface uses the mapped memory directly (with BGRA the pixels are already in the display format):
+    atlas = pygame.image.frombuffer(memoryview(atlas_map)[pixels_start:], (index["width"], index["height"]),
+                                    ATLAS_FORMAT)
+    if not BGRA_SUPPORTED and pygame.display.get_surface() is not None:
+        # RGBA is not the pixel order of the display, converted once here instead of at every blit of a frame:
+        atlas = atlas.convert_alpha()
+    return {(getattr(game_config, frame["asset"]), frame["size"], frame["rotation"]):
+            atlas.subsurface(pygame.Rect(frame["rect"])) for frame in index["frames"]}
+
+
+if __name__ == '__main__':
+    pygame.init()
+    pygame.display.set_mode((game_config.WIDTH, game_config.HEIGHT), pygame.HIDDEN)
+    frame_count, atlas_bytes = bake_atlas()
+    print("Baked {} frames into {} ({} bytes)".format(frame_count, ATLAS_PATH, atlas_bytes))
@@ -0,0 +1,42 @@
+import pygame
+import numpy as np
+from utils import reshape_and_rotate
+
+
+class BushLayer:
+    """The bushes of a level rendered once into an overlay, with an occupancy bitmap for the hiding checks"""
+
+    def __init__(self, bushes):
+        self.bushes = bushes
+        # the overlay only covers the bounding box of the bushes (it is empty in a level without bushes):
+        self.rect = bounding_rect([pygame.Rect(bush.x, bush.y, bush.size, bush.size) for bush in bushes])
+        self.surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        for bush in bushes:
+            self.surface.blit(reshape_and_rotate(bush.picture, bush.size, 0),
+                              (bush.x - self.rect.x, bush.y - self.rect.y))
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()
+
+        # occupancy bitmap over the bounding box of the bush rectangles (where the player is hidden) and its
+        # summed area table, so the number of covered pixels under any rectangle can be read with 4 lookups:
+        self.hiding_rect = bounding_rect([bush.rect for bush in bushes])
+        occupancy = np.zeros((self.hiding_rect.height, self.hiding_rect.width), dtype=np.int32)
+        for bush in bushes:
+            rect = bush.rect.move(-self.hiding_rect.x, -self.hiding_rect.y)
+            occupancy[rect.top:rect.bottom, rect.left:rect.right] = 1
+        self.summed_area = np.zeros((self.hiding_rect.height + 1, self.hiding_rect.width + 1), dtype=np.int32)
+        self.summed_area[1:, 1:] = occupancy.cumsum(axis=0).cumsum(axis=1)
+
+    def is_hidden(self, rect):
+        """Check if a rectangle overlaps with any of the bushes (same as colliderect with any bush rectangle)"""
+        rect = rect.clip(self.hiding_rect).move(-self.hiding_rect.x, -self.hiding_rect.y)
+        if rect.width == 0 or rect.height == 0:
+            return False
+        covered = self.summed_area[rect.bottom, rect.right] - self.summed_area[rect.top, rect.right] - \
+            self.summed_area[rect.bottom, rect.left] + self.summed_area[rect.top, rect.left]
+        return bool(covered > 0)
+
+
+def bounding_rect(rects):
+    """The smallest rectangle containing all the rectangles (a zero-sized one if there are none)"""
+    return rects[0].unionall(rects[1:]) if rects else pygame.Rect(0, 0, 0, 0)
@@ -1,24 +1,56 @@
 import pygame
+import math
 import numpy as np
 from game_config import FPS, PLAYER_RIGHT, PLAYER_LEFT, PLAYER_STAND, GUARD_RIGHT, GUARD_LEFT, GUARD_STAND, \
-    VIEW_RANGE, OBSTACLES
+    VIEW_RANGE
+from level import LEVEL
+from navigation import PATH_PENDING
+from trigonometry import direction
+from entities import ENTITIES
+
+# the obstacles never move, so they are indexed once in a uniform grid (compiled with the level):
+OBSTACLE_GRID = LEVEL.obstacle_grid
+
 
 class Character:
     """Character class"""
 
-    def __init__(self, pic, name="John Doe", x=0, y=0, speed=2, rotation_speed=4, rotation=0, size=35):
+    __slots__ = ("pic", "name", "rotation_speed", "clock", "walk_last_time", "walk_start_time", "rect", "store",
+                 "entity_id", "x", "y", "rotation", "speed", "size")
+    STORED = ("x", "y", "rotation", "speed", "size")  # these are copied into the entity store
+
+    def __init__(self, pic, name="John Doe", x=0, y=0, speed=2, rotation_speed=4, rotation=0, size=35,
+                 clock=pygame.time, store=ENTITIES):
+        self.store, self.entity_id = store, store.allocate()
         self.pic, self.name, self.x, self.y, self.speed, self.rotation_speed, self.rotation, self.size = pic, name, x, \
             y, speed, rotation_speed, rotation, size
+        self.clock = clock  # anything with get_ticks, e.g. the simulation clock
         self.walk_last_time = 0
         self.walk_start_time = None
         self.rect = pygame.Rect(self.x, self.y, self.size, self.size)
 
+    def animate(self, ticks):
+        """Set the picture of the walking animation at the given time in milliseconds"""
+        # the updating time in the walking images is tied to the character's speed:
+        time_diff = (ticks - self.walk_start_time) / (500 / self.speed)
+        time_diff_mod = int(time_diff) % 4  # 3 possible states rotate in a 4 element cycle
+        right, stand, left = self.WALKING_PICTURES
+        if time_diff_mod == 0:
+            self.pic = right
+        elif (time_diff_mod == 1) or (time_diff_mod == 3):
+            self.pic = stand
+        else:
+            self.pic = left
+
 
 class Player(Character):
     """Class for the playable character"""
 
-    def __init__(self, pic, name, x, y, speed, rotation_speed, rotation, size):
-        super().__init__(pic, name, x, y, speed, rotation_speed, rotation, size)
+    __slots__ = ("hiding",)
+    WALKING_PICTURES = (PLAYER_RIGHT, PLAYER_STAND, PLAYER_LEFT)
+
+    def __init__(self, pic, name, x, y, speed, rotation_speed, rotation, size, clock=pygame.time, store=ENTITIES):
+        super().__init__(pic, name, x, y, speed, rotation_speed, rotation, size, clock, store)
         self.hiding = False
 
     def move(self, keys_pressed):
@@ -30,33 +62,21 @@ class Player(Character):
             self.rotation -= self.rotation_speed
         # movement with the up arrow':
         if keys_pressed[pygame.K_UP]:
-            # animation:
-            time_now = pygame.time.get_ticks()
-            # the updating time in the walking images is tied to the character's speed:
-            time_diff = (time_now - self.walk_start_time) / (500 / self.speed)
-            time_diff_mod = np.mod(int(time_diff), 4)  # 3 possible states rotate in a 4 element cycle
-            if time_diff_mod == 0:
-                self.pic = PLAYER_RIGHT
-            elif (time_diff_mod == 1) or (time_diff_mod == 3):
-                self.pic = PLAYER_STAND
-            else:
-                self.pic = PLAYER_LEFT
+            self.animate(self.clock.get_ticks())
 
             # it will eventually move if some time passed since the last update (making it less smooth intentionally):
-            if (pygame.time.get_ticks() - self.walk_last_time > (FPS * 0.6)):
-                x_delta = -np.sin(self.rotation * np.pi / 180) * self.speed
-                y_delta = -np.cos(self.rotation * np.pi / 180) * self.speed
+            if (self.clock.get_ticks() - self.walk_last_time > (FPS * 0.6)):
+                x_delta, y_delta = direction(self.rotation, self.speed)
 
                 # create a temporary rectangle with the new positions and check if the move is valid:
                 temp_rect = pygame.Rect(self.rect.x + x_delta, self.rect.y + y_delta, self.size, self.size)
-                num_collides = np.sum([temp_rect.colliderect(obstacle) for obstacle in OBSTACLES])
                 # if valid then move, else just stand at that point:
-                if num_collides == 0:
+                if not OBSTACLE_GRID.collides(temp_rect):
                     self.rect.x += x_delta
                     self.rect.y += y_delta
                     self.x = self.rect.x
                     self.y = self.rect.y
-                    self.walk_last_time = pygame.time.get_ticks()
+                    self.walk_last_time = self.clock.get_ticks()
                 else:
                     self.pic = PLAYER_STAND
 
@@ -64,28 +84,55 @@ class Player(Character):
 class Guard(Character):
     """Guard class"""
 
-    def __init__(self, pic, name, x, y, rotation, size):
-        super().__init__(pic, name, x, y, speed=0, rotation_speed=0, rotation=rotation, size=size)
+    __slots__ = ("view_range_scale", "view_range_x", "view_range_y", "alive", "killed_at")
+    STORED = Character.STORED + ("alive", "killed_at")
+    WALKING_PICTURES = (GUARD_RIGHT, GUARD_STAND, GUARD_LEFT)
+    static = False
+
+    def __init__(self, pic, name, x, y, rotation, size, clock=pygame.time, store=ENTITIES):
+        super().__init__(pic, name, x, y, speed=0, rotation_speed=0, rotation=rotation, size=size, clock=clock,
+                         store=store)
         self.alive = True
         self.killed_at = None
         # view range scale and the (x, y) coordinates for the image positioning:
         self.view_range_scale = 8
+        self.update_view_range()
+
+    def update_view_range(self):
+        """Move the rectangle and the view range image position to the (x, y) position of the guard"""
+        self.rect.x = self.x
+        self.rect.y = self.y
         self.view_range_x = self.x + self.size / 2 - self.size * self.view_range_scale / 2
         self.view_range_y = self.y + self.size / 2 - self.size * self.view_range_scale / 2
 
-    def move(self):
-        pass
+    def move(self, steps=1):
+        """Movement of the guard over a number of simulation steps (e.g. the ones skipped by the AI scheduler)
+
+        Every step is taken at its own simulation time, so a guard updated less often ends up at the same place.
+        """
+        ticks_ago = getattr(self.clock, "ticks_ago", None)  # pygame.time has no steps to go back to
+        for steps_ago in range(steps - 1, -1, -1):
+            self.step(self.clock.get_ticks() if ticks_ago is None else ticks_ago(steps_ago))
+
+    def step(self, ticks):
+        """Movement of the guard in one simulation step at the given time in milliseconds"""
 
 
 class GuardStanding(Guard):
     """Standing guard class"""
 
+    __slots__ = ()
+    static = True  # never moves or rotates (its view range can be precomputed)
+
 
 class GuardWalking(Guard):
     """Walking guard class"""
 
-    def __init__(self, pic, name, x, y, rotation, size, speed, moving_direction, target):
-        super().__init__(pic, name, x, y, rotation=rotation, size=size)
+    __slots__ = ("x_1", "y_1", "x_2", "y_2", "target_rotation", "at_targets", "at_start")
+
+    def __init__(self, pic, name, x, y, rotation, size, speed, moving_direction, target, clock=pygame.time,
+                 store=ENTITIES):
+        super().__init__(pic, name, x, y, rotation=rotation, size=size, clock=clock, store=store)
         # the walking guard will walk between (x1, y1) and (x2, y2) with some speed
         # the walking is implemented in a way that it can only move to horizontal or vertical direction
         if moving_direction == "horizontal":
@@ -104,7 +151,7 @@ class GuardWalking(Guard):
         self.at_targets = True
         self.at_start = True  # if we are just at the start we don't want the target_rotation switched
 
-    def move(self):
+    def step(self, ticks):
         """Movement of the walking guard"""
         if self.killed_at is None:
             # rotate the guard if it is not at the target_rotation:
@@ -112,18 +159,9 @@ class GuardWalking(Guard):
                 self.rotation += self.speed
             else:
                 if self.walk_start_time is None:
-                    self.walk_start_time = pygame.time.get_ticks()  # moving
-                # animation:
-                time_now = pygame.time.get_ticks()
-                time_diff = (time_now - self.walk_start_time) / (500 / self.speed)
-                time_diff_mod = np.mod(int(time_diff), 4)  # 3 possible states rotate in a 4 element cycle
-                if time_diff_mod == 0:
-                    self.pic = GUARD_RIGHT
-                elif (time_diff_mod == 1) or (time_diff_mod == 3):
-                    self.pic = GUARD_STAND
-                else:
-                    self.pic = GUARD_LEFT
-                if (pygame.time.get_ticks() - self.walk_last_time > (FPS * 0.6)):
+                    self.walk_start_time = ticks  # moving
+                self.animate(ticks)
+                if (ticks - self.walk_last_time > (FPS * 0.6)):
                     # move if the guard is in the proper direction:
                     if self.target_rotation == 270:
                         self.x += self.speed
@@ -133,12 +171,8 @@ class GuardWalking(Guard):
                         self.y += self.speed
                     else:
                         self.y -= self.speed
-                    self.rect.x = self.x
-                    self.rect.y = self.y
-                    # move the view range too:
-                    self.view_range_x = self.x + self.size / 2 - self.size * self.view_range_scale / 2
-                    self.view_range_y = self.y + self.size / 2 - self.size * self.view_range_scale / 2
-                    self.walk_last_time = pygame.time.get_ticks()
+                    self.update_view_range()
+                    self.walk_last_time = ticks
 
             # if we are not at the start and we have just collided with one of the end points now,
             # switch target rotation:
@@ -159,10 +193,113 @@ class GuardWalking(Guard):
                 self.at_start = False
 
 
+class GuardPatrolling(Guard):
+    """Guard patrolling along a loop of waypoints, finding its way on the navigation grid"""
+
+    __slots__ = ("navigation", "waypoints", "waypoint_index", "path", "target", "investigating", "flow_field")
+
+    def __init__(self, pic, name, x, y, rotation, size, speed, waypoints, navigation, clock=pygame.time,
+                 store=ENTITIES):
+        super().__init__(pic, name, x, y, rotation=rotation, size=size, clock=clock, store=store)
+        self.speed = speed
+        self.navigation = navigation
+        self.waypoints = list(waypoints)  # (x, y) positions of the guard
+        self.waypoint_index = 0
+        self.path = []  # the next (x, y) positions to walk to
+        self.target = None  # the (x, y) position waiting for a path from the navigation grid
+        self.investigating = False
+        self.flow_field = None  # the shared flow field of a pursuit
+
+    def plan(self, point):
+        """Path of (x, y) positions to a point, the last position is the point itself
+
+        Returns None if the path has to wait for the search budget of a next step.
+        """
+        half_size = self.size / 2
+        path = self.navigation.request_path((self.x + half_size, self.y + half_size),
+                                            (point[0] + half_size, point[1] + half_size))
+        if path is PATH_PENDING:
+            return None
+        if path is None:
+            return []  # unreachable
+        return [(x - half_size, y - half_size) for x, y in path[:-1]] + [tuple(point)]
+
+    def investigate(self, point):
+        """Walk to a point (e.g. a noise), then go back to the patrol"""
+        self.path, self.target = [], tuple(point)
+        self.investigating = True
+
+    def pursue(self, flow_field):
+        """Chase the goal of a shared flow field (None goes back to the patrol)"""
+        self.flow_field = flow_field
+        self.path = []
+        if flow_field is None:
+            self.target = self.waypoints[self.waypoint_index]  # back to the waypoint it was walking to
+
+    def step(self, ticks):
+        """Movement of the patrolling guard"""
+        if self.killed_at is not None:
+            return
+        if self.flow_field is not None:
+            # one step on the flow field, every pursuing guard reads the same field:
+            half_size = self.size / 2
+            point = self.flow_field.steer((self.x + half_size, self.y + half_size))
+            self.path = [] if point is None else [(point[0] - half_size, point[1] - half_size)]
+            if not self.path:
+                return  # as close to the goal as the grid gets
+        elif not self.path:
+            if self.target is None:
+                # next waypoint (or back to the current one after an investigation):
+                if self.investigating:
+                    self.investigating = False
+                else:
+                    self.waypoint_index = (self.waypoint_index + 1) % len(self.waypoints)
+                self.target = self.waypoints[self.waypoint_index]
+            path = self.plan(self.target)
+            if path is None:
+                return  # waiting for the path
+            self.path, self.target = path, None
+            if not self.path:
+                return
+
+        x_delta, y_delta = self.path[0][0] - self.x, self.path[0][1] - self.y
+        distance = math.hypot(x_delta, y_delta)
+        if distance == 0:
+            self.path.pop(0)
+            return
+        # rotate the guard towards the next position first (the same way as a walking guard):
+        target_rotation = round(math.degrees(math.atan2(-x_delta, -y_delta))) % 360
+        rotation_diff = (target_rotation - self.rotation + 180) % 360 - 180
+        if rotation_diff != 0:
+            self.rotation += max(-self.speed, min(self.speed, rotation_diff))
+            return
+
+        if self.walk_start_time is None:
+            self.walk_start_time = ticks  # moving
+        self.animate(ticks)
+        if ticks - self.walk_last_time > (FPS * 0.6):
+            if distance <= self.speed:
+                self.x, self.y = self.path.pop(0)
+            else:
+                self.x += x_delta / distance * self.speed
+                self.y += y_delta / distance * self.speed
+            self.update_view_range()
+            self.walk_last_time = ticks
+
+
 class Bush:
     """Bush class"""
 
-    def __init__(self, picture, x, y, size):
-        self.picture, self.x, self.y, self.size = picture, x, y, size
+    __slots__ = ("picture", "rect", "store", "entity_id", "x", "y", "size")
+    STORED = ("x", "y", "size")  # these are copied into the entity store
+
+    def __init__(self, picture, x, y, size, store=ENTITIES):
+        self.store, self.entity_id = store, store.allocate()
+        self.picture, self.size = picture, size
+        self.place(x, y)
+
+    def place(self, x, y):
+        """Move the bush (e.g. to a new random place in the next game)"""
+        self.x, self.y = x, y
         # the bush rectangle is a third of the bush size to make the hiding more realistic:
         self.rect = pygame.Rect(self.x+self.size/3, self.y+self.size/3, self.size/3, self.size/3)
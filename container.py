@@ -0,0 +1,28 @@
+import json
+import mmap
+import struct
+
+
+def write_container_header(file, magic, index):
+    """Write the header of a container file: the magic bytes, the length of the JSON index and the index itself
+
+    The index is padded with spaces, so the data written after the header starts 4 byte aligned.
+    """
+    header = json.dumps(index).encode()
+    header += b" " * (-(len(magic) + 4 + len(header)) % 4)
+    file.write(magic + struct.pack("<I", len(header)) + header)
+
+
+def open_container(path, magic):
+    """Memory map a container file, return the map, the index and the offset of the data after the header
+
+    Raises ValueError if the file does not start with the magic bytes.
+    """
+    with open(path, "rb") as file:
+        container_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if container_map[:len(magic)] != magic:
+        raise ValueError("{} is not a {} file".format(path, magic.decode()))
+    header_start = len(magic) + 4
+    header_length = struct.unpack("<I", container_map[len(magic):header_start])[0]
+    index = json.loads(container_map[header_start:header_start + header_length])
+    return container_map, index, header_start + header_length
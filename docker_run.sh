@@ -1,2 +1,2 @@
-# unfortunately this is not working (possibly some problem with the video display accessibility for pygame)
-docker build -t dockerize_ac . && docker run -it dockerize_ac
\ No newline at end of file
+# the container has no video display, so the game can only run there in headless mode (no window, uncapped FPS):
+docker build -t dockerize_ac . && docker run -it dockerize_ac main.py --headless --frames 1000
@@ -0,0 +1,88 @@
+import sys
+import numpy as np
+
+
+class EntityStore:
+    """Struct of arrays keeping the state of the entities (characters and bushes) in contiguous NumPy arrays
+
+    Every entity is a row. The entity objects keep their attributes as plain slots (the per entity code reads and
+    writes them at full speed) and write copies their STORED attributes into their rows, only for the entities which
+    have changed (e.g. the guards moved at a simulation step) before the batched code reads the columns.
+    """
+
+    COLUMNS = {"x": np.float64, "y": np.float64, "rotation": np.float64, "speed": np.float64, "size": np.float64,
+               "alive": np.bool_, "killed_at": np.float64}
+    NULLABLE = {"killed_at"}  # None is stored as nan in these columns
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self.columns["killed_at"][:] = np.nan
+
+    def allocate(self):
+        """Add a new row and return its index (the columns are doubled when they are full)"""
+        if self.count == len(self.columns["x"]):
+            for name, column in self.columns.items():
+                grown = np.zeros(2 * len(column), dtype=column.dtype)
+                if name in self.NULLABLE:
+                    grown[:] = np.nan
+                grown[:len(column)] = column
+                self.columns[name] = grown
+        self.count += 1
+        return self.count - 1
+
+    def clear(self):
+        """Remove every entity (the arrays are kept for the next level)"""
+        self.count = 0
+        for name, column in self.columns.items():
+            column[:] = np.nan if name in self.NULLABLE else 0
+
+    def write(self, entities):
+        """Copy the STORED attributes of the entities into their rows (None is stored as nan)"""
+        columns = self.columns
+        for entity in entities:
+            row = entity.entity_id
+            for name in entity.STORED:
+                value = getattr(entity, name)
+                columns[name][row] = np.nan if value is None else value
+
+    def __getattr__(self, name):
+        """The used part of a column, e.g. store.x"""
+        try:
+            return self.__dict__["columns"][name][:self.__dict__["count"]]
+        except KeyError:
+            raise AttributeError(name)
+
+    def centers(self, indices):
+        """Centers of the entity rectangles (the same as their pygame.Rect center)"""
+        x, y, size = self.columns["x"][indices], self.columns["y"][indices], self.columns["size"][indices]
+        half = rect_round(size) // 2
+        return rect_round(x) + half, rect_round(y) + half
+
+
+def rect_round(values):
+    """Round the values to integers the same way as pygame.Rect does with floats (halves away from zero)"""
+    return np.trunc(values + np.copysign(0.5, values)).astype(int)
+
+
+ENTITIES = EntityStore()  # the default store
+
+
+def footprint_report(entities):
+    """Memory used by the entities: {type name: (count, bytes per entity, total bytes)} and the total of all
+
+    An entity is counted with its instance (and __dict__ if it has one), its rectangle and its row in the store.
+    """
+    report = {}
+    for entity in entities:
+        size = sys.getsizeof(entity)
+        if hasattr(entity, "__dict__"):
+            size += sys.getsizeof(entity.__dict__)
+        if hasattr(entity, "rect"):
+            size += sys.getsizeof(entity.rect)
+        if hasattr(entity, "store"):
+            size += sum(column.itemsize for column in entity.store.columns.values())
+        count, total = report.get(type(entity).__name__, (0, 0))
+        report[type(entity).__name__] = (count + 1, total + size)
+    report = {name: (count, total // count, total) for name, (count, total) in report.items()}
+    return report, sum(total for _, _, total in report.values())
@@ -0,0 +1,120 @@
+import os
+import io
+import json
+import hashlib
+import zipfile
+import pygame
+import numpy as np
+from spatial import SpatialHash
+from navigation import NavigationGrid
+
+# the level of the game (another level file can be played with the PYGAME_CREED_LEVEL environment variable):
+LEVEL_PATH = os.environ.get("PYGAME_CREED_LEVEL", os.path.join("Levels", "level_1.json"))
+COMPILER_VERSION = 1  # increase it when the compiled format changes, so the old caches are rebuilt
+
+
+class Level:
+    """A level described by a JSON file: size, obstacles, walls, bridges, static layers, king, arrow, player, guards and
+    bushes
+
+    The obstacle arrays, the spatial index of the obstacles and the navigation grid are compiled into a binary blob
+    next to the level file (keyed by a hash of the source), later startups load them from it instead of building them.
+    """
+
+    def __init__(self, path=LEVEL_PATH, cache_path=None):
+        data = read_level_data(path)
+        source = json.dumps(data, sort_keys=True).encode()  # with the entries of the base level
+        self.source_hash = hashlib.sha1(source + str(COMPILER_VERSION).encode()).hexdigest()
+        self.name = data["name"]
+        self.width, self.height = data["size"]
+        self.obstacles = [pygame.Rect(obstacle) for obstacle in data["obstacles"]]
+        self.walls = [(wall["image"], tuple(wall["location"])) for wall in data["walls"]]  # (image name, (x, y))
+        self.bridges = [(bridge["image"], tuple(bridge["location"])) for bridge in data["bridges"]]
+        # more images baked into the static layer on top of the map (image name, (x, y)):
+        self.static_layers = [(layer["image"], tuple(layer["location"])) for layer in data.get("static_layers", [])]
+        self.king_location, self.king_area = tuple(data["king"]["location"]), pygame.Rect(data["king"]["area"])
+        self.arrow_location = tuple(data["arrow"]["location"])
+        self.player = data["player"]  # keyword arguments of the Player
+        self.guards = data["guards"]  # keyword arguments of the guards with their "type"
+        # ((x from, x to), (y from, y to), number of bushes) areas where the bushes are placed randomly in every game:
+        self.bush_size = data["bushes"]["size"]
+        self.bush_areas = [(tuple(area["x"]), tuple(area["y"]), area["count"]) for area in data["bushes"]["areas"]]
+
+        self.cache_path = os.path.splitext(path)[0] + ".bin" if cache_path is None else cache_path
+        self.compiled = self.load_compiled()
+        if self.compiled is None:
+            self.compiled = self.compile()
+            try:
+                # written next to it and moved into place, so an interrupted write never leaves a truncated cache:
+                temporary_path = self.cache_path + ".tmp"
+                with open(temporary_path, "wb") as file:
+                    file.write(self.compiled)
+                os.replace(temporary_path, self.cache_path)
+            except OSError:
+                pass  # the cache is best effort (e.g. a read-only install), the level is compiled every time then
+        self.unpack(self.compiled)
+
+    def compile(self):
+        """The binary blob of the obstacle arrays, the spatial index and the navigation grid of the level"""
+        obstacle_grid = SpatialHash(self.obstacles)
+        navigation = NavigationGrid(self.obstacles, self.width, self.height)
+        arrays = {"source_hash": np.array(self.source_hash),
+                  "obstacles": np.array([tuple(obstacle) for obstacle in self.obstacles], dtype=np.int32)}
+        arrays.update({"grid_" + name: array for name, array in obstacle_grid.to_arrays(self.obstacles).items()})
+        arrays.update({"navigation_" + name: array for name, array in navigation.to_arrays().items()})
+        arrays["navigation_settings"] = np.array([navigation.cell_size, navigation.agent_size])
+        blob = io.BytesIO()
+        np.savez_compressed(blob, **arrays)
+        return blob.getvalue()
+
+    def load_compiled(self):
+        """The compiled blob from the cache if it was compiled from the same source (None otherwise)"""
+        if not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, "rb") as file:
+                compiled = file.read()
+            with np.load(io.BytesIO(compiled)) as arrays:
+                return compiled if str(arrays["source_hash"]) == self.source_hash else None
+        except (ValueError, OSError, KeyError, EOFError, zipfile.BadZipFile):
+            return None  # not a compiled level (e.g. a truncated file), it is compiled again
+
+    def unpack(self, compiled):
+        """Set the obstacle arrays, the spatial index and the navigation grid from the compiled blob"""
+        with np.load(io.BytesIO(compiled)) as arrays:
+            self.obstacle_array = arrays["obstacles"]  # (left, top, width, height) rows
+            self.obstacle_grid = SpatialHash.from_arrays(self.obstacles, arrays["grid_cell_size"], arrays["grid_cells"],
+                                                         arrays["grid_cell_counts"], arrays["grid_rect_indices"])
+            cell_size, agent_size = arrays["navigation_settings"].tolist()
+            self.navigation = NavigationGrid(None, self.width, self.height, cell_size=cell_size, agent_size=agent_size)
+            self.navigation.set_arrays(arrays["navigation_walkable"], arrays["navigation_neighbour_counts"],
+                                       arrays["navigation_neighbour_cells"], arrays["navigation_neighbour_diagonal"])
+
+
+def read_level_data(path):
+    """The entries of a level file
+
+    A level file with a "base" entry (the path of another level file, relative to it) is a variant of that level: its
+    own entries replace the ones of the base level and its "guards_by_name" replace the guards with the same names.
+    """
+    with open(path, "rb") as file:
+        data = json.loads(file.read())
+    if "base" not in data:
+        return data
+    variant = dict(data)
+    data = read_level_data(os.path.join(os.path.dirname(path), variant.pop("base")))
+    guards_by_name = variant.pop("guards_by_name", {})
+    data.update(variant)
+    data["guards"] = [dict(guards_by_name.get(guard["name"], guard), name=guard["name"]) for guard in data["guards"]]
+    return data
+
+
+LEVEL = Level()  # the level of the game
+
+
+if __name__ == "__main__":
+    # compile the level again (e.g. after editing it) and print the size of the blob:
+    if os.path.exists(LEVEL.cache_path):
+        os.remove(LEVEL.cache_path)
+    level = Level()
+    print("{}: {} bytes compiled to {}".format(level.name, len(level.compiled), level.cache_path))
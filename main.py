@@ -1,17 +1,78 @@
 import pygame
 import os
 import sys
+import math
+import time
+import tracemalloc
+import argparse
 import numpy as np
-from game_config import WIDTH, HEIGHT, FPS, WHITE, BACKGROUND, WALL_LOCATIONS, BRIDGE_LOCATIONS, ARROW_LOCATION, \
-    KING_LOCATION, WALL_1, WALL_2, WALL_3, WALL_4, BRIDGE, ARROW, FIGHT_CLOUD, KING, PLAYER_STAND, GUARD_STAND, \
-    GUARD_DEAD, BUSH, VIEW_RANGE, STARTSCREEN
-from character import Player, GuardStanding, GuardWalking, Bush
-from utils import rotate_around_center, reshape_and_rotate, get_distance_and_angle
+import game_config
+from game_config import WIDTH, HEIGHT, FPS, WHITE, DIRTY_RECT_RENDERING, SHOW_HUD, ARROW, FIGHT_CLOUD, \
+    PLAYER_RIGHT, PLAYER_LEFT, PLAYER_STAND, GUARD_RIGHT, GUARD_LEFT, GUARD_STAND, GUARD_DEAD, BUSH, VIEW_RANGE, \
+    STARTSCREEN
+from character import Player, GuardStanding, GuardWalking, GuardPatrolling, Bush
+from utils import TRANSFORM_CACHE, rotate_around_center, reshape_and_rotate
+from renderer import Renderer, build_static_layer, LAYER_GUARDS, LAYER_VIEW_RANGES, LAYER_PLAYER, LAYER_BUSHES, \
+    LAYER_OVERLAYS
+from bushes import BushLayer
+from vision import GuardVision
+from visibility import VisibilityGrid
+from navigation import FlowField
+from level import LEVEL
+from session import Session
+from scheduler import AIScheduler
+from entities import ENTITIES, footprint_report
+from text import TEXT
+from assets import ASSETS, display_format, format_asset_report
+from atlas import load_atlas
+from archive import open_archive
+
+
+def parse_args(args):
+    """Command line options (the environment variables are used as defaults, so scripts can set them too)"""
+    parser = argparse.ArgumentParser(description="Pygame Creed 2D")
+    parser.add_argument("--headless", action="store_true", default=os.environ.get("PYGAME_CREED_HEADLESS") == "1",
+                        help="run without a window on the dummy video driver with uncapped FPS")
+    parser.add_argument("--frames", type=int, default=int(os.environ.get("PYGAME_CREED_FRAMES", 0)),
+                        help="quit after this many game frames and print the timing (0: never)")
+    parser.add_argument("--no-render", action="store_true", default=os.environ.get("PYGAME_CREED_NO_RENDER") == "1",
+                        help="only run the simulation without drawing anything (for batch runs)")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="print the memory footprint of the entities of the level when it is loaded and the "
+                             "loaded images at the end")
+    parser.add_argument("--soak", type=int, default=0,
+                        help="restart the level this many times (every game runs --frames frames, 30 by default) and "
+                             "print the allocated memory")
+    parser.add_argument("--seed", type=int, default=os.environ.get("PYGAME_CREED_SEED"),
+                        help="random seed (e.g. the bush locations) for reproducible runs")
+    return parser.parse_known_args(args)[0]
+
+
+ARGS = parse_args(sys.argv[1:])
+if ARGS.headless:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"  # no window is needed (or available e.g. in a container)
 
 pygame.init()
 
 WIN = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Pygame Creed 2D")  # app title
+ASSETS.archive = open_archive()  # the images from one memory mapped file (if they have been packed)
+TRANSFORM_CACHE.pin(load_atlas())  # pre-rotated frames of the rotating sprites (if the atlas has been baked)
+# line of sight between the parts of the level for the guards (built once and cached on disk):
+VISIBILITY = VisibilityGrid(LEVEL.obstacles, LEVEL.width, LEVEL.height)
+# walkable cells and cached paths for the patrolling guards (compiled with the level):
+NAVIGATION = LEVEL.navigation
+# towards the player, shared by the pursuing guards (only computed when a guard reads it and the player has got to
+# another cell):
+FLOW_FIELD = FlowField(NAVIGATION)
+# the patrolling guards hear a running player within the hearing distance and chase them until they are further away
+# than the losing distance:
+HEARING_DISTANCE, LOSING_DISTANCE = 150, 300
+
+# the images used while playing (loaded on first use, the ones of the static layer are only used while it is built):
+GAME_IMAGES = [STARTSCREEN, PLAYER_RIGHT, PLAYER_LEFT, PLAYER_STAND, GUARD_RIGHT, GUARD_LEFT, GUARD_STAND, GUARD_DEAD,
+               ARROW, FIGHT_CLOUD, VIEW_RANGE, BUSH]
+GUARD_TYPES = {"standing": GuardStanding, "walking": GuardWalking, "patrolling": GuardPatrolling}  # in the level file
 
 # user generated events for guard alerts and for finding the king:
 GUARD_ALERT = pygame.USEREVENT + 1  # these numbers are just identifiers
@@ -20,123 +81,179 @@ KING_FOUND = pygame.USEREVENT + 2
 
 def draw_text(text):
     """Draw a text to the center of the screen"""
-    text_to_draw = pygame.font.SysFont("comicsans", 100).render(text, 1, WHITE)
+    text_to_draw = TEXT.render(text, "comicsans", 100, WHITE)
     WIN.blit(text_to_draw, (WIDTH // 2 - text_to_draw.get_width() // 2, HEIGHT // 2 - text_to_draw.get_height() // 2))
     pygame.display.update()
 
 
-def draw_window(player, guards, bushes):
+def draw_window(player, guards, bush_layer, renderer, fps=0):
     """Pygame window update function"""
-    WIN.blit(BACKGROUND, (0, 0))
-    WIN.blit(WALL_1, WALL_LOCATIONS[0])
-    WIN.blit(WALL_2, WALL_LOCATIONS[1])
-    WIN.blit(WALL_3, WALL_LOCATIONS[2])
-    WIN.blit(WALL_4, WALL_LOCATIONS[3])
-    WIN.blit(BRIDGE, BRIDGE_LOCATIONS[0])
-    WIN.blit(BRIDGE, BRIDGE_LOCATIONS[1])
+    # background, walls, bridges and the king are baked into the static layer of the renderer,
+    # here we only collect the (layer, key, surface, position) sprites on top of it:
+    sprites = []
 
     for guard in guards:
-        WIN.blit(reshape_and_rotate(guard.pic, guard.size, guard.rotation), (guard.x, guard.y))
+        sprites.append((LAYER_GUARDS, guard, reshape_and_rotate(guard.pic, guard.size, guard.rotation),
+                        (guard.x, guard.y)))
         # if not killed or being killed, add the view range:
         if guard.killed_at is None:
-            WIN.blit(reshape_and_rotate(VIEW_RANGE, guard.size * guard.view_range_scale, guard.rotation-180),
-                     (guard.view_range_x, guard.view_range_y))
+            sprites.append((LAYER_VIEW_RANGES, (guard, "view_range"),
+                            reshape_and_rotate(VIEW_RANGE, guard.size * guard.view_range_scale, guard.rotation-180),
+                            (guard.view_range_x, guard.view_range_y)))
 
     # draw player:
-    WIN.blit(reshape_and_rotate(player.pic, player.size, player.rotation), (player.x, player.y))
+    sprites.append((LAYER_PLAYER, player, reshape_and_rotate(player.pic, player.size, player.rotation),
+                    (player.x, player.y)))
 
-    # draw bushes:
-    for bush in bushes:
-        WIN.blit(reshape_and_rotate(bush.picture, bush.size, 0), (bush.x, bush.y))
+    # draw bushes (they are pre-rendered into one overlay):
+    sprites.append((LAYER_BUSHES, bush_layer, bush_layer.surface, bush_layer.rect.topleft))
 
     # draw arrow at the beginning:
-    if player.x == 1200 and player.y == 570:
-        WIN.blit(reshape_and_rotate(ARROW, 100, 0), ARROW_LOCATION)
+    if player.x == LEVEL.player["x"] and player.y == LEVEL.player["y"]:
+        sprites.append((LAYER_OVERLAYS, "arrow", reshape_and_rotate(ARROW, 100, 0), LEVEL.arrow_location))
 
     # player is hiding if he is under the bushes:
     if player.hiding:
-        WIN.blit(reshape_and_rotate(ARROW, 35, player.rotation-90), (player.x, player.y))
+        sprites.append((LAYER_OVERLAYS, (player, "hiding"), reshape_and_rotate(ARROW, 35, player.rotation-90),
+                        (player.x, player.y)))
 
-    # interaction with guards:
+    # fighting cloud where the player meets with a living guard:
     for guard in guards:
-        # if the player meets with a living guard we create the fighting cloud and after a small time the guard is dead:
         if player.rect.collidepoint(guard.rect.center) > 0 and guard.alive:
-            WIN.blit(reshape_and_rotate(FIGHT_CLOUD, 70, np.random.randint(180)),
-                     (guard.x-guard.size/2, guard.y-guard.size/2))
-            now_time = pygame.time.get_ticks()
-            if guard.killed_at is None:
-                guard.killed_at = now_time
-            elif now_time - guard.killed_at > 200:
-                guard.alive = False
-                guard.pic = GUARD_DEAD
+            sprites.append((LAYER_OVERLAYS, (guard, "fight_cloud"),
+                            reshape_and_rotate(FIGHT_CLOUD, 70, np.random.randint(180)),
+                            (guard.x-guard.size/2, guard.y-guard.size/2)))
 
-    # draw the king:
-    WIN.blit(reshape_and_rotate(KING, 40, 270), KING_LOCATION)
+    # head-up display with the FPS, the number of living guards and the draw calls of the previous frame
+    # (the labels and values are cached text runs):
+    if SHOW_HUD:
+        runs = ["FPS: ", str(int(fps)), "   Guards: ", str(sum(guard.alive for guard in guards)), "/", str(len(guards)),
+                "   Draw calls: ", str(renderer.draw_calls)]
+        for i, (surface, position) in enumerate(TEXT.render_runs(runs, "comicsans", 24, WHITE, (20, 25))):
+            sprites.append((LAYER_OVERLAYS, ("hud", i), surface, position))
 
-    pygame.display.update()
+    renderer.draw(sprites)
 
 
-def guard_alerts(player, guards):
+def guard_alerts(player, guards, vision, active=None):
     """Check if the guards see the player or any dead body. If so, raise an alert"""
+    # if the player is within view range of any guard (we cover a little bit less than the half circle, hence the
+    # 80 degrees), all the guards are checked at once:
+    vision.update(guards)
+    if not player.hiding and vision.detect(*player.rect.center).any():
+        pygame.event.post(pygame.event.Event(GUARD_ALERT))
+    # if any dead body is within view range of a guard updated at this step (only the bodies near the guards are
+    # checked):
+    if vision.sees_dead_body(guards, active):
+        pygame.event.post(pygame.event.Event(GUARD_ALERT))
+
+
+def pursuits(player, guards):
+    """The patrolling guards which hear the running player chase them on the flow field, then go back to the patrol"""
+    running = player.speed > LEVEL.player["speed"]
     for guard in guards:
-        distance, angle = get_distance_and_angle(player, guard)
-        if guard.alive and guard.killed_at is None:
-            # if the player is within view range (we cover a little bit less than the half circle, hence the 80 degrees)
-            if not player.hiding and distance < 140 and angle < 80:
-                pygame.event.post(pygame.event.Event(GUARD_ALERT))
-            # this is really not an optimal or scalable solution to check all other guards for all guards but with just
-            # a few of them it is ok for now
-            for other_guard in guards:
-                if other_guard != guard:
-                    distance, angle = get_distance_and_angle(other_guard, guard)
-                    # if the other guard is dead and within view range:
-                    if other_guard.killed_at is not None and distance < 140 and angle < 80:
-                        pygame.event.post(pygame.event.Event(GUARD_ALERT))
+        if isinstance(guard, GuardPatrolling) and guard.killed_at is None:
+            distance = math.hypot(guard.rect.centerx - player.rect.centerx, guard.rect.centery - player.rect.centery)
+            if guard.flow_field is None and running and distance < HEARING_DISTANCE:
+                guard.pursue(FLOW_FIELD)
+            elif guard.flow_field is not None and distance > LOSING_DISTANCE:
+                guard.pursue(None)
+
+
+def fights(player, guards, now_time):
+    """If the player meets with a living guard they fight and after a small time the guard is dead"""
+    for guard in guards:
+        if player.rect.collidepoint(guard.rect.center) > 0 and guard.alive:
+            if guard.killed_at is None:
+                guard.killed_at = now_time
+            elif now_time - guard.killed_at > 200:
+                guard.alive = False
+                guard.pic = GUARD_DEAD
+            ENTITIES.write([guard])
 
 
 def king_found(player):
     """King is found event"""
-    if player.rect.colliderect(pygame.Rect(40, 270, 60, 40)):
+    if player.rect.colliderect(LEVEL.king_area):
         pygame.event.post(pygame.event.Event(KING_FOUND))
 
 
-def main():
-    player = Player(PLAYER_STAND, name="John", x=1200, y=570, speed=3, rotation_speed=4, rotation=90, size=35)
-    bushes = [Bush(BUSH, np.random.randint(1075, 1200), np.random.randint(100, 300), 50) for i in range(25)] + \
-        [Bush(BUSH, np.random.randint(1075, 1150), np.random.randint(300, 350), 50) for i in range(5)] + \
-        [Bush(BUSH, np.random.randint(700, 900), np.random.randint(25, 75), 50) for i in range(10)] + \
-        [Bush(BUSH, np.random.randint(800, 850), np.random.randint(200, 350), 50) for i in range(15)] + \
-        [Bush(BUSH, np.random.randint(700, 850), np.random.randint(575, 625), 50) for i in range(7)] + \
-        [Bush(BUSH, np.random.randint(200, 230), np.random.randint(450, 650), 50) for i in range(12)] + \
-        [Bush(BUSH, np.random.randint(225, 240), np.random.randint(100, 200), 50) for i in range(7)] + \
-        [Bush(BUSH, np.random.randint(375, 400), np.random.randint(200, 450), 50) for i in range(10)]
-    guards = [
-        GuardStanding(GUARD_STAND, name="Guard_1", x=1075, y=570, rotation=90, size=35),
-        GuardStanding(GUARD_STAND, name="Guard_2", x=1040, y=200, rotation=180, size=35),
-        GuardWalking(GUARD_STAND, name="Guard_3", x=1040, y=250, rotation=0,
-                     size=35, speed=3, moving_direction="vertical", target=400),
-        GuardWalking(GUARD_STAND, name="Guard_4", x=710, y=120, rotation=270,
-                     size=35, speed=3, moving_direction="horizontal", target=850),
-        GuardWalking(GUARD_STAND, name="Guard_5", x=735, y=200, rotation=180,
-                     size=35, speed=3, moving_direction="vertical", target=375),
-        GuardStanding(GUARD_STAND, name="Guard_6", x=825, y=440, rotation=270, size=35),
-        GuardWalking(GUARD_STAND, name="Guard_7", x=300, y=120, rotation=270,
-                     size=35, speed=3, moving_direction="horizontal", target=625),
-        GuardWalking(GUARD_STAND, name="Guard_8", x=300, y=550, rotation=270,
-                     size=35, speed=3, moving_direction="horizontal", target=625),
-        GuardWalking(GUARD_STAND, name="Guard_9", x=300, y=150, rotation=270,
-                     size=35, speed=3, moving_direction="vertical", target=520),
-        GuardStanding(GUARD_STAND, name="Guard_10", x=225, y=280, rotation=270, size=35),
-    ]
-
-    WIN.blit(STARTSCREEN, (0, 0))  # start screen
+def simulate(player, guards, bush_layer, vision, scheduler, keys_pressed, sim_clock):
+    """Advance the game by one fixed simulation step"""
+    sim_clock.advance()
+
+    NAVIGATION.new_step()  # a new search budget for the paths of the patrolling guards
+
+    # move player:
+    player.move(keys_pressed)
+
+    # the patrolling guards which hear the player chase them:
+    pursuits(player, guards)
+
+    # move guards (the far ones not at every step):
+    active = scheduler.run(player, guards)
+    # the vision reads the guards from the entity store:
+    ENTITIES.write([guard for guard, updated in zip(guards, active) if updated])
+
+    # is the player hiding:
+    player.hiding = bush_layer.is_hidden(player.rect)
+
+    # guard alerts:
+    guard_alerts(player, guards, vision, active)
+
+    # is the king found:
+    king_found(player)
+
+    # fights with the guards:
+    fights(player, guards, sim_clock.get_ticks())
+
+
+def create_level(sim_clock):
+    """The player, the guards and the bushes of the level (created once, a new game resets them in place)"""
+    player = Player(PLAYER_STAND, clock=sim_clock, **LEVEL.player)
+    guards = []
+    for guard in LEVEL.guards:
+        guard = dict(guard)
+        guard_type = GUARD_TYPES[guard.pop("type")]
+        if guard_type is GuardPatrolling:
+            guard["navigation"] = NAVIGATION
+        guards.append(guard_type(GUARD_STAND, clock=sim_clock, **guard))
+    # the bushes are placed in every game:
+    bushes = [Bush(BUSH, 0, 0, LEVEL.bush_size) for _, _, count in LEVEL.bush_areas for i in range(count)]
+    for entities in ([player], guards, bushes):
+        ENTITIES.write(entities)
+    return player, guards, bushes
+
+
+def place_bushes(bushes):
+    """Put the bushes to new random places in their areas"""
+    placed = iter(bushes)
+    for (x_low, x_high), (y_low, y_high), count in LEVEL.bush_areas:
+        for i in range(count):
+            next(placed).place(np.random.randint(x_low, x_high), np.random.randint(y_low, y_high))
+    ENTITIES.write(bushes)
+
+
+def play(session, vision, renderer, frame_limit=0, report=True):
+    """Play a game of the session, return False if it was stopped at the frame limit instead of the end of the game"""
+    if ARGS.seed is not None:
+        np.random.seed(ARGS.seed)
+    player, guards, sim_clock = session.player, session.guards, session.clock
+    place_bushes(session.bushes)  # new places in every game
+    bush_layer = BushLayer(session.bushes)
+    # the far guards are updated less often (catching up the skipped steps):
+    scheduler = AIScheduler()
+    renderer.invalidate()  # the window has been drawn over since the last game
+
+    WIN.blit(display_format(STARTSCREEN), (0, 0))  # start screen
     pygame.display.update()
     clock = pygame.time.Clock()
     run = True
-    game_started = False
+    game_started = ARGS.headless  # there is nobody to press Enter in headless mode
+    frames, start_time = 0, time.perf_counter()
     while run:
-        # controlling FPS:
-        clock.tick(FPS)
+        # controlling FPS (uncapped in headless mode):
+        elapsed_ms = clock.tick(0 if ARGS.headless else FPS)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -151,7 +268,7 @@ def main():
             if game_started:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_UP:
-                        player.walk_start_time = pygame.time.get_ticks()  # moving
+                        player.walk_start_time = sim_clock.get_ticks()  # moving
                     if event.key == pygame.K_x:
                         player.speed *= 2  # running
 
@@ -164,38 +281,86 @@ def main():
                 # break the game if the player or a dead body was been detected:
                 if event.type == GUARD_ALERT:
                     draw_text("YOU HAVE BEEN DETECTED!")
-                    pygame.time.delay(3000)  # wait 3 sec
+                    if not ARGS.headless:
+                        pygame.time.delay(3000)  # wait 3 sec
                     run = False
 
                 # break the game (winning!) if the king has been found:
                 if event.type == KING_FOUND:
                     draw_text("YOU HAVE FOUND THE KING!")
-                    pygame.time.delay(6000)  # wait 3 sec
+                    if not ARGS.headless:
+                        pygame.time.delay(6000)  # wait 3 sec
                     run = False
 
         if game_started:
 
-            # move player:
-            player.move(pygame.key.get_pressed())
-
-            # move guards:
-            for guard in guards:
-                guard.move()
-
-            # is the player hiding:
-            player.hiding = True if np.sum([player.rect.colliderect(bush.rect) for bush in bushes]) > 0 else False
-
-            # guard alerts:
-            guard_alerts(player, guards)
-
-            # is the king found:
-            king_found(player)
+            # run as many fixed simulation steps as the elapsed time covers (in headless mode exactly one step per
+            # frame, so the runs are reproducible and as fast as possible), but stop at the end of the game:
+            keys_pressed = pygame.key.get_pressed()
+            for _ in range(1 if ARGS.headless else session.timestep.steps(elapsed_ms)):
+                simulate(player, guards, bush_layer, vision, scheduler, keys_pressed, sim_clock)
+                if pygame.event.peek([GUARD_ALERT, KING_FOUND]):
+                    break
 
             # draw window:
-            draw_window(player, guards, bushes)
+            if not ARGS.no_render:
+                draw_window(player, guards, bush_layer, renderer, clock.get_fps())
+
+            # stop after the given number of frames (e.g. for performance runs):
+            frames += 1
+            if frames == frame_limit:
+                if report:
+                    seconds = time.perf_counter() - start_time
+                    print("{} frames in {:.2f} s ({:.1f} FPS)".format(frames, seconds, frames / seconds))
+                    print("AI updates: {updated} updated, {skipped} skipped, {deferred} deferred in {steps} steps"
+                          .format(**scheduler.stats()))
+                return False
+
+    return True
+
+
+def soak(session, vision, renderer, games, frames):
+    """Restart the level many times and print the allocated memory, which should stay flat"""
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for game in range(1, games + 1):
+        play(session, vision, renderer, frame_limit=frames, report=False)
+        session.restart()
+        if game % max(games // 10, 1) == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            print("{:>7} games: {:>10} bytes allocated (peak: {} bytes), {:.1f} s".format(
+                game, current, peak, time.perf_counter() - start_time))
+    tracemalloc.stop()
 
-    # restart the game:
-    main()
+
+def main():
+    ENTITIES.clear()  # the entities of the level are created once and reused by every game
+    ASSETS.acquire(GAME_IMAGES)
+    session = Session(create_level, 1000 / FPS)
+    FLOW_FIELD.target = session.player  # the player object stays the same at every restart
+    if ARGS.memory_report:
+        report, total = footprint_report([session.player] + session.guards + session.bushes)
+        for name, (count, size, type_total) in report.items():
+            print("{:<15}{:>6} x {:>5} bytes = {:>8} bytes".format(name, count, size, type_total))
+        print("{:<15}{:>33} bytes".format("total", total))
+
+    vision = GuardVision(visibility=VISIBILITY)
+    vision.build_view_masks(session.guards)  # the view of the standing guards never changes
+
+    # the parts of the map that never change are drawn once into the static layer of the renderer (with the static
+    # layers of the level file, which refer to their images by their names in game_config):
+    static_layers = [(getattr(game_config, name), location) for name, location in LEVEL.static_layers]
+    renderer = Renderer(WIN, build_static_layer(static_layers), dirty_rects=DIRTY_RECT_RENDERING)
+
+    if ARGS.soak:
+        soak(session, vision, renderer, ARGS.soak, ARGS.frames or 30)
+    else:
+        # restart the game in place after every game (until the frame limit):
+        while play(session, vision, renderer, frame_limit=ARGS.frames):
+            session.restart()
+    if ARGS.memory_report:
+        print(format_asset_report(ASSETS.report()))
+    ASSETS.release(GAME_IMAGES)
 
 
 if __name__ == '__main__':
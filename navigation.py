@@ -0,0 +1,256 @@
+import heapq
+from collections import OrderedDict
+import math
+import pygame
+import numpy as np
+from spatial import SpatialHash
+
+PATH_PENDING = object()  # a path request waiting for the search budget of a next step
+
+
+class NavigationGrid:
+    """Walkable cells of the level for characters of a given size, with cached A* paths between the cells
+
+    The characters request their paths with request_path, which runs at most max_searches (uncached) searches in a
+    simulation step, the rest waits in a queue for the next steps (the oldest requests first). The budget is counted
+    in searches, not in time, so the runs stay reproducible.
+    """
+
+    def __init__(self, obstacles, width, height, cell_size=20, agent_size=35, max_searches=4):
+        self.width, self.height, self.cell_size, self.agent_size = width, height, cell_size, agent_size
+        self.columns, self.rows = width // cell_size, height // cell_size
+        self.paths = {}  # (start cell, goal cell) -> path of cell center points
+        self.hits = self.misses = 0
+        self.max_searches = max_searches  # searches per simulation step for the requested paths
+        self.searches = 0  # searches in the current step
+        self.waiting = OrderedDict()  # (start cell, goal cell) of the requests over the budget, the oldest first
+        self.deferred = 0  # number of requests which had to wait
+        self.version = 0  # increased every time the level changes
+        if obstacles is not None:  # None: the cells are set later with set_arrays (e.g. from a compiled level)
+            self.set_obstacles(obstacles)
+
+    def set_obstacles(self, obstacles):
+        """(Re)build the walkable cells from the obstacles, this invalidates every cached path"""
+        obstacle_grid = SpatialHash(obstacles)
+        agent = pygame.Rect(0, 0, self.agent_size, self.agent_size)
+        self.walkable = np.zeros((self.rows, self.columns), dtype=bool)
+        for row in range(self.rows):
+            for column in range(self.columns):
+                agent.center = self.cell_center((column, row))
+                self.walkable[row, column] = not obstacle_grid.collides(agent)
+        # neighbours of every cell as lists of (flat cell index, step cost), diagonal steps may not cut corners
+        # (a blocked cell can be left to any walkable neighbour, e.g. a character standing right next to a wall):
+        self.neighbours = []
+        for row in range(self.rows):
+            for column in range(self.columns):
+                cell_neighbours = []
+                for row_step in (-1, 0, 1):
+                    for column_step in (-1, 0, 1):
+                        neighbour = (column + column_step, row + row_step)
+                        if (row_step or column_step) and self.is_walkable(neighbour) and \
+                                (not self.walkable[row, column] or (self.is_walkable((column + column_step, row)) and
+                                                                    self.is_walkable((column, row + row_step)))):
+                            cell_neighbours.append((neighbour[1] * self.columns + neighbour[0],
+                                                    math.sqrt(2) if row_step and column_step else 1))
+                self.neighbours.append(cell_neighbours)
+        self.paths.clear()
+        self.waiting.clear()
+        self.version += 1
+
+    def to_arrays(self):
+        """The walkable cells and the neighbour lists as flat arrays (e.g. to save them with a compiled level)"""
+        return {"walkable": self.walkable,
+                "neighbour_counts": np.array([len(cell_neighbours) for cell_neighbours in self.neighbours],
+                                             dtype=np.uint8),
+                "neighbour_cells": np.array([neighbour for cell_neighbours in self.neighbours
+                                             for neighbour, _ in cell_neighbours], dtype=np.int32),
+                "neighbour_diagonal": np.array([step_cost != 1 for cell_neighbours in self.neighbours
+                                                for _, step_cost in cell_neighbours], dtype=bool)}
+
+    def set_arrays(self, walkable, neighbour_counts, neighbour_cells, neighbour_diagonal):
+        """Use the arrays of to_arrays instead of building the cells from the obstacles, this invalidates every path"""
+        self.walkable = np.asarray(walkable, dtype=bool)
+        step_costs = np.where(neighbour_diagonal, math.sqrt(2), 1).tolist()
+        steps = list(zip(np.asarray(neighbour_cells).tolist(), step_costs))
+        ends = np.cumsum(neighbour_counts).tolist()
+        self.neighbours = [steps[end - count:end] for end, count in zip(ends, np.asarray(neighbour_counts).tolist())]
+        self.paths.clear()
+        self.waiting.clear()
+        self.version += 1
+
+    def is_walkable(self, cell):
+        column, row = cell
+        return 0 <= column < self.columns and 0 <= row < self.rows and bool(self.walkable[row, column])
+
+    def cell_of(self, point):
+        """The cell of an (x, y) point"""
+        return (min(max(int(point[0] // self.cell_size), 0), self.columns - 1),
+                min(max(int(point[1] // self.cell_size), 0), self.rows - 1))
+
+    def cell_center(self, cell):
+        return (cell[0] + 0.5) * self.cell_size, (cell[1] + 0.5) * self.cell_size
+
+    def find_path(self, start, goal):
+        """Path of cell center points from the start point (exclusive) to the goal point's cell (inclusive)
+
+        Returns None if the goal cannot be reached. The paths are cached by (start cell, goal cell).
+        """
+        key = (self.cell_of(start), self.cell_of(goal))
+        if key in self.paths:
+            self.hits += 1
+            return self.paths[key]
+        self.misses += 1
+        self.searches += 1
+        path = self.a_star(*key)
+        self.paths[key] = path
+        return path
+
+    def request_path(self, start, goal):
+        """The same as find_path within the search budget of the step, PATH_PENDING if the request has to wait"""
+        key = (self.cell_of(start), self.cell_of(goal))
+        if key in self.paths or (not self.waiting and self.searches < self.max_searches):
+            return self.find_path(start, goal)
+        if key not in self.waiting:
+            self.waiting[key] = None
+            self.deferred += 1
+        return PATH_PENDING
+
+    def new_step(self):
+        """Start the search budget of a new simulation step, the waiting requests are searched first"""
+        self.searches = 0
+        while self.waiting and self.searches < self.max_searches:
+            key, _ = self.waiting.popitem(last=False)
+            if key not in self.paths:
+                self.misses += 1
+                self.searches += 1
+                self.paths[key] = self.a_star(*key)
+
+    def a_star(self, start_cell, goal_cell):
+        """A* search with the octile distance heuristic (on flat cell indices for speed)"""
+        if start_cell == goal_cell:
+            return ()
+        if not self.is_walkable(goal_cell):
+            return None
+        columns, diagonal = self.columns, math.sqrt(2) - 1
+        start, goal = start_cell[1] * columns + start_cell[0], goal_cell[1] * columns + goal_cell[0]
+        goal_row, goal_column = goal_cell[1], goal_cell[0]
+        costs, came_from = [math.inf] * (columns * self.rows), {start: None}
+        costs[start] = 0
+        queue = [(0, 0, start)]
+        while queue:
+            _, cost, cell = heapq.heappop(queue)
+            if cell == goal:
+                path = []
+                while cell != start:
+                    path.append(self.cell_center((cell % columns, cell // columns)))
+                    cell = came_from[cell]
+                return tuple(reversed(path))
+            if cost > costs[cell]:
+                continue  # we have already found a shorter way to this cell
+            for neighbour, step_cost in self.neighbours[cell]:
+                new_cost = cost + step_cost
+                if new_cost < costs[neighbour]:
+                    costs[neighbour], came_from[neighbour] = new_cost, cell
+                    row_distance, column_distance = abs(neighbour // columns - goal_row), \
+                        abs(neighbour % columns - goal_column)
+                    heuristic = max(row_distance, column_distance) + diagonal * min(row_distance, column_distance)
+                    heapq.heappush(queue, (new_cost + heuristic, new_cost, neighbour))
+        return None
+
+
+class FlowField:
+    """Dijkstra distance map towards a goal (e.g. the player) on a navigation grid, shared by any number of guards
+
+    The field is only computed again when the goal moves to another cell, the fields of the last visited goal cells
+    are kept, so going back and forth between cells costs nothing. Reading the way from a cell is a lookup. With a
+    target (anything with a rect, e.g. the player) the field follows it by itself whenever it is read, so it costs
+    nothing while nobody uses it.
+    A new goal cell is deliberately a full recompute and not an incremental repair of the previous field: it takes
+    about a millisecond on a level sized grid and keeps the field simple.
+    """
+
+    def __init__(self, navigation, max_fields=64, target=None):
+        self.navigation, self.max_fields, self.target = navigation, max_fields, target
+        self.fields = OrderedDict()  # goal cell -> (distances, next cells), least recently used first
+        self.version = None
+        self.steps, self.step_costs = None, None  # (steps, cells) arrays of the neighbour lists
+        self.goal_cell = None
+        self.distances, self.next_cells = None, None
+        self.computed = 0  # number of computed fields
+
+    def update(self, goal):
+        """Point the field at the cell of the goal point (computing the whole field for a goal cell not seen lately)"""
+        if self.version != self.navigation.version:
+            self.fields.clear()  # the level has changed
+            self.version, self.goal_cell = self.navigation.version, None
+            self.build_steps()
+        goal_cell = self.navigation.cell_of(goal)
+        if goal_cell == self.goal_cell:
+            return
+        self.goal_cell = goal_cell
+        if goal_cell not in self.fields:
+            self.fields[goal_cell] = self.compute(goal_cell)
+            if len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        self.fields.move_to_end(goal_cell)
+        self.distances, self.next_cells = self.fields[goal_cell]
+
+    def build_steps(self):
+        """The neighbour lists of the navigation grid as (steps, cells) arrays of the neighbours and the step costs
+
+        The missing steps point at an extra cell after the last one, which is never reachable.
+        """
+        neighbours = self.navigation.neighbours
+        cell_count = len(neighbours)
+        step_count = max(len(cell_neighbours) for cell_neighbours in neighbours)
+        self.steps = np.full((step_count, cell_count), cell_count)
+        self.step_costs = np.full((step_count, cell_count), math.inf)
+        for cell, cell_neighbours in enumerate(neighbours):
+            for step, (neighbour, step_cost) in enumerate(cell_neighbours):
+                self.steps[step, cell], self.step_costs[step, cell] = neighbour, step_cost
+
+    def compute(self, goal_cell):
+        """Distance of every cell from the goal cell and the neighbour to step to (-1: none) as flat lists"""
+        self.computed += 1
+        navigation, columns = self.navigation, self.navigation.columns
+        neighbours, walkable = navigation.neighbours, navigation.walkable.ravel().tolist()
+        goal = goal_cell[1] * columns + goal_cell[0]
+        distances = [math.inf] * (len(neighbours) + 1)  # with an extra cell for the missing steps
+        distances[goal] = 0
+        queue = [(0, goal)]
+        # the steps between walkable cells are symmetric, so we can search from the goal (only through the walkable
+        # cells, nothing steps into the other ones):
+        while queue:
+            distance, cell = heapq.heappop(queue)
+            if distance > distances[cell] or (cell != goal and not walkable[cell]):
+                continue
+            for neighbour, step_cost in neighbours[cell]:
+                if distance + step_cost < distances[neighbour]:
+                    distances[neighbour] = distance + step_cost
+                    heapq.heappush(queue, (distance + step_cost, neighbour))
+
+        # the next cell is the neighbour on the shortest way, every cell at once:
+        distances = np.array(distances)
+        candidates = distances[self.steps] + self.step_costs
+        best = candidates.argmin(axis=0)
+        cells = np.arange(len(neighbours))
+        best_distances = candidates[best, cells]
+        next_cells = self.steps[best, cells]
+        distances = distances[:-1]
+        # only step downhill, a cell next to a goal inside a wall is as close as it gets:
+        stepping = (best_distances <= distances + 1e-9) & np.isfinite(best_distances)
+        leaving = np.isinf(distances) & np.isfinite(best_distances)  # a blocked cell is left to its best neighbour
+        distances[leaving] = best_distances[leaving]
+        next_cells[~(stepping | leaving)] = -1
+        next_cells[goal] = -1
+        return distances.tolist(), next_cells.tolist()
+
+    def steer(self, point):
+        """Center of the next cell on the way from a point to the goal (None at the goal or if it is unreachable)"""
+        if self.target is not None:
+            self.update(self.target.rect.center)
+        column, row = self.navigation.cell_of(point)
+        next_cell = self.next_cells[row * self.navigation.columns + column]
+        if next_cell < 0:
+            return None
+        return self.navigation.cell_center((next_cell % self.navigation.columns, next_cell // self.navigation.columns))
@@ -0,0 +1,120 @@
+import pygame
+import game_config
+from game_config import WIDTH, HEIGHT, BACKGROUND, KING
+from level import LEVEL
+from utils import reshape_and_rotate
+from assets import ASSETS, display_format
+
+
+def build_static_layer(extra_layers=()):
+    """Compose the parts of the map that never change into a single surface
+
+    extra_layers is an iterable of (surface or image path, (x, y)) pairs that a level wants to bake in on top of the map
+    """
+    extra_layers = list(extra_layers)
+    # the walls and the bridges refer to their images by their names in game_config:
+    decorations = [(getattr(game_config, name), location) for name, location in LEVEL.walls + LEVEL.bridges]
+    # these images are only needed until they are baked in:
+    images = [BACKGROUND, KING] + [image for image, _ in decorations] + \
+        [image for image, _ in extra_layers if isinstance(image, str)]
+    ASSETS.acquire(images)
+    static_layer = pygame.Surface((WIDTH, HEIGHT))
+    static_layer.blit(display_format(BACKGROUND), (0, 0))
+    for image, location in decorations:
+        static_layer.blit(display_format(image), location)
+    static_layer.blit(reshape_and_rotate(KING, 40, 270), LEVEL.king_location)
+    for image, location in extra_layers:
+        static_layer.blit(display_format(image), location)
+    ASSETS.release(images)
+    # convert to the display format if there is a display already (blitting it is much faster this way):
+    if pygame.display.get_surface() is not None:
+        static_layer = static_layer.convert()
+    return static_layer
+
+
+def merge_rects(rects):
+    """Merge the overlapping rectangles so every pixel is redrawn only once"""
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+# render layers, drawn in this order:
+LAYER_BACKGROUND, LAYER_GUARDS, LAYER_VIEW_RANGES, LAYER_PLAYER, LAYER_BUSHES, LAYER_OVERLAYS = range(6)
+
+
+class Renderer:
+    """Draw the sprites of a frame on top of the static layer
+
+    The sprites are sorted by layer and every layer is drawn with a single Surface.blits call.
+    In dirty rectangle mode only the areas where a sprite appeared, disappeared, moved or changed are restored from
+    the static layer, redrawn and passed to pygame.display.update. Otherwise the whole screen is redrawn every frame.
+    """
+
+    def __init__(self, window, static_layer, dirty_rects=True, debug_hook=None):
+        self.window, self.static_layer, self.dirty_rects = window, static_layer, dirty_rects
+        self.last_sprites = None  # sprite key -> (surface, rect, special flags) of the previous frame
+        # debug_hook(render_list, draw_calls) is called after every frame:
+        self.debug_hook = debug_hook
+        self.render_list = []  # (layer, key, surface, rect, special flags) of the last frame, sorted by layer
+        self.draw_calls = 0  # number of blit and blits calls in the last frame
+
+    def invalidate(self):
+        """Force a full redraw in the next frame (e.g. after something was drawn over the window)"""
+        self.last_sprites = None
+
+    def blit_layers(self, render_list, area=None):
+        """Blit the render list with one Surface.blits call per layer (only the sprites touching the area)"""
+        layers = {}
+        for layer, key, surface, rect, flags in render_list:
+            if area is None or rect.colliderect(area):
+                layers.setdefault(layer, []).append((surface, rect, None, flags))
+        for layer in sorted(layers):
+            self.window.blits(layers[layer], doreturn=False)
+            self.draw_calls += 1
+
+    def draw(self, sprites):
+        """Draw a list of (layer, key, surface, (x, y)[, special flags]) sprites
+
+        The key identifies the same sprite between frames, sprites of the same layer are drawn in the list order.
+        """
+        self.render_list = sorted([(layer, key, surface, surface.get_rect(topleft=position), flags[0] if flags else 0)
+                                   for layer, key, surface, position, *flags in sprites], key=lambda sprite: sprite[0])
+        current_sprites = {key: (surface, rect, flags) for _, key, surface, rect, flags in self.render_list}
+        self.draw_calls = 0
+
+        if not self.dirty_rects or self.last_sprites is None:
+            self.window.blit(self.static_layer, (0, 0))
+            self.draw_calls += 1
+            self.blit_layers(self.render_list)
+            pygame.display.update()
+        else:
+            # collect the previous and the current rectangle of every sprite that changed:
+            dirty = []
+            for key in self.last_sprites.keys() | current_sprites.keys():
+                last, current = self.last_sprites.get(key), current_sprites.get(key)
+                if last == current:
+                    continue
+                if last is not None:
+                    dirty.append(last[1])
+                if current is not None:
+                    dirty.append(current[1])
+            dirty = merge_rects(dirty)
+            # restore these areas from the static layer and redraw the sprites over them (clipped to the area):
+            for dirty_rect in dirty:
+                self.window.set_clip(dirty_rect)
+                self.window.blit(self.static_layer, dirty_rect, dirty_rect)
+                self.draw_calls += 1
+                self.blit_layers(self.render_list, dirty_rect)
+            self.window.set_clip(None)
+            pygame.display.update(dirty)
+
+        self.last_sprites = current_sprites
+        if self.debug_hook is not None:
+            self.debug_hook(self.render_list, self.draw_calls)
@@ -0,0 +1,69 @@
+import math
+import numpy as np
+
+
+class AIScheduler:
+    """Time-sliced guard updates with a level of detail by the distance from the player
+
+    The guards near the player are updated at every simulation step, the further guards only at every few steps
+    (their tier's interval). An update moves the guard over all the steps since its last one, so the skipped steps are
+    caught up and the guards end up where they would be with an update at every step. At most max_updates due far
+    guards are updated in a step, the latest ones first, the rest is deferred to the next step (and is first in the
+    line then). The limit is a number of updates and not a time budget, so the runs stay reproducible.
+    The first tier has to cover the view distance (with some slack for the movement in between), so everything that
+    can see the player is always up-to-date and the detection stays exact.
+    """
+
+    def __init__(self, tiers=((200, 1), (400, 2), (math.inf, 4)), max_updates=8):
+        self.tiers = tiers  # (distance limit, update interval in steps), the first tier is never skipped
+        self.max_updates = max_updates  # far guard updates per step, None: no limit
+        self.step = 0
+        self.last_update = {}  # guard -> the step of its last update
+        self.active = np.zeros(0, dtype=bool)  # the guards updated at the last step
+        self.guards = []
+        self.indices = np.zeros(0, dtype=int)  # rows of the guards in their entity store
+        self.updated, self.skipped, self.deferred = 0, 0, 0  # totals for the statistics
+
+    def intervals(self, player, guards):
+        """Update interval (in steps) of every guard by its distance from the player"""
+        if guards is not self.guards:
+            self.guards = guards
+            self.indices = np.array([guard.entity_id for guard in guards], dtype=int)
+        x, y = guards[0].store.centers(self.indices)
+        distance = np.hypot(x - player.rect.centerx, y - player.rect.centery)
+        intervals = np.full(len(guards), self.tiers[-1][1])
+        for limit, interval in reversed(self.tiers[:-1]):
+            intervals[distance < limit] = interval
+        return intervals
+
+    def update(self, guard):
+        """Move a guard over the steps since its last update (one step at its first update)"""
+        guard.move(self.step - self.last_update.get(guard, self.step - 1))
+        self.last_update[guard] = self.step
+
+    def run(self, player, guards):
+        """Move the guards which are due at this step, return the boolean mask of the updated guards"""
+        self.step += 1
+        self.active = np.zeros(len(guards), dtype=bool)
+        if not guards:
+            return self.active
+        intervals = self.intervals(player, guards)
+        late = np.array([self.step - self.last_update.get(guard, -math.inf) for guard in guards]) - intervals
+        for index in np.flatnonzero(intervals == self.tiers[0][1]):
+            self.update(guards[index])  # near the player: always
+            self.active[index] = True
+        # the far guards which are due, the latest first:
+        due = [index for index in np.argsort(-late, kind="stable") if late[index] >= 0 and not self.active[index]]
+        if self.max_updates is not None and len(due) > self.max_updates:
+            self.deferred += len(due) - self.max_updates
+            due = due[:self.max_updates]
+        for index in due:
+            self.update(guards[index])
+            self.active[index] = True
+        self.updated += int(self.active.sum())
+        self.skipped += int((late < 0).sum())
+        return self.active
+
+    def stats(self):
+        """Totals of the updated, skipped (not due) and deferred (due, but over the limit) guard updates"""
+        return {"steps": self.step, "updated": self.updated, "skipped": self.skipped, "deferred": self.deferred}
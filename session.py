@@ -0,0 +1,60 @@
+import copy
+import pygame
+from simulation import SimClock, FixedTimestep
+
+
+class LevelTemplate:
+    """Snapshot of the starting state of some entities: their rows in the entity store and their own attributes
+
+    Restoring it puts the same entity objects back to the start of the level, so nothing has to be created again.
+    """
+
+    MUTABLE = (list, dict, set, pygame.Rect)  # these are copied, everything else (e.g. the pictures) is shared
+
+    def __init__(self, entities):
+        self.entities = entities
+        self.rows = {}  # store -> (row indices, {column name: values})
+        for entity in entities:
+            self.rows.setdefault(entity.store, []).append(entity.entity_id)
+        self.rows = {store: (rows, {name: column[rows].copy() for name, column in store.columns.items()})
+                     for store, rows in self.rows.items()}
+        self.attributes = [{name: self.copy(getattr(entity, name)) for name in self.slots(entity)
+                            if hasattr(entity, name)} for entity in entities]
+
+    @staticmethod
+    def slots(entity):
+        """Names of the instance attributes of a __slots__ class (and its bases)"""
+        return [name for cls in type(entity).__mro__ for name in getattr(cls, "__slots__", ())]
+
+    def copy(self, value):
+        return copy.copy(value) if isinstance(value, self.MUTABLE) else value
+
+    def restore(self):
+        """Reset the entities to the snapshot in place"""
+        for store, (rows, columns) in self.rows.items():
+            for name, values in columns.items():
+                store.columns[name][rows] = values
+        for entity, attributes in zip(self.entities, self.attributes):
+            for name, value in attributes.items():
+                setattr(entity, name, self.copy(value))
+
+
+class Session:
+    """A level played again and again: the entities are created once and reset in place at every restart
+
+    create_level(clock) returns the player, the guards and the bushes of the level, using the given simulation clock.
+    """
+
+    def __init__(self, create_level, step_ms):
+        self.clock = SimClock(step_ms)  # every character uses the same simulation clock
+        self.timestep = FixedTimestep(step_ms)
+        self.player, self.guards, self.bushes = create_level(self.clock)
+        self.template = LevelTemplate([self.player] + self.guards + self.bushes)
+        self.games = 1
+
+    def restart(self):
+        """Start the level again with the same objects (no new allocations, no recursion)"""
+        self.template.restore()
+        self.clock.reset()
+        self.timestep.reset()
+        self.games += 1
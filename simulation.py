@@ -0,0 +1,50 @@
+class SimClock:
+    """Simulation clock advanced in fixed steps, it can be used in place of pygame.time (get_ticks)"""
+
+    def __init__(self, step_ms):
+        self.step_ms = step_ms
+        self.time = 0.0
+        self.steps = 0
+
+    def advance(self):
+        """Move the clock one step forward"""
+        self.steps += 1
+        self.time = self.steps * self.step_ms
+
+    def reset(self):
+        """Back to the start (e.g. for a new game)"""
+        self.time = 0.0
+        self.steps = 0
+
+    def get_ticks(self):
+        """Simulation time in milliseconds (as pygame.time.get_ticks)"""
+        return int(self.time)
+
+    def ticks_ago(self, steps):
+        """Simulation time in milliseconds a number of steps ago (as get_ticks returned it then)"""
+        return int((self.steps - steps) * self.step_ms)
+
+
+class FixedTimestep:
+    """Accumulator turning the elapsed wall-clock time into a number of fixed simulation steps"""
+
+    def __init__(self, step_ms, max_steps=5):
+        self.step_ms = step_ms
+        self.max_steps = max_steps  # the most steps run in a frame when catching up after a spike
+        self.accumulator = 0.0
+        self.dropped_steps = 0
+
+    def reset(self):
+        """Forget the time left over from the previous frames"""
+        self.accumulator = 0.0
+
+    def steps(self, elapsed_ms):
+        """Number of simulation steps to run for a frame that took elapsed_ms"""
+        self.accumulator += elapsed_ms
+        steps = int(self.accumulator // self.step_ms)
+        self.accumulator -= steps * self.step_ms
+        if steps > self.max_steps:
+            # we are too far behind, drop the rest instead of spiralling into ever longer frames:
+            self.dropped_steps += steps - self.max_steps
+            steps = self.max_steps
+        return steps
@@ -0,0 +1,62 @@
+import pygame
+import numpy as np
+
+
+class SpatialHash:
+    """Uniform grid over rectangles, a query only tests the rectangles in the cells it touches"""
+
+    def __init__(self, rects=(), cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> list of (rect, item)
+        for rect in rects:
+            self.insert(rect)
+
+    def cell_range(self, rect):
+        """The (column, row) cells covered by a rectangle"""
+        for column in range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1):
+            for row in range(rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size + 1):
+                yield column, row
+
+    def insert(self, rect, item=None):
+        """Add a rectangle (with an optional item attached to it) to every cell it covers"""
+        rect = pygame.Rect(rect)
+        for cell in self.cell_range(rect):
+            self.cells.setdefault(cell, []).append((rect, item))
+
+    def collides(self, rect):
+        """Check if a rectangle collides with any of the rectangles (returns at the first hit)"""
+        for cell in self.cell_range(rect):
+            for other, _ in self.cells.get(cell, ()):
+                if rect.colliderect(other):
+                    return True
+        return False
+
+    def query(self, rect):
+        """All the (rect, item) pairs colliding with a rectangle"""
+        found, seen = [], set()
+        for cell in self.cell_range(rect):
+            for other, item in self.cells.get(cell, ()):
+                if id(other) not in seen and rect.colliderect(other):
+                    seen.add(id(other))
+                    found.append((other, item))
+        return found
+
+    def to_arrays(self, rects):
+        """The cells as flat arrays of indices into a list of the rectangles (e.g. to save them with a compiled level)"""
+        positions = {tuple(rect): index for index, rect in enumerate(rects)}
+        cells = sorted(self.cells)
+        return {"cell_size": np.array(self.cell_size),
+                "cells": np.array(cells, dtype=np.int32).reshape(-1, 2),
+                "cell_counts": np.array([len(self.cells[cell]) for cell in cells], dtype=np.int32),
+                "rect_indices": np.array([positions[tuple(rect)] for cell in cells for rect, _ in self.cells[cell]],
+                                         dtype=np.int32)}
+
+    @classmethod
+    def from_arrays(cls, rects, cell_size, cells, cell_counts, rect_indices):
+        """Spatial hash from the arrays of to_arrays (without any items) and the same list of rectangles"""
+        spatial_hash = cls(cell_size=int(cell_size))
+        rects = [pygame.Rect(rect) for rect in rects]
+        rect_indices, ends = rect_indices.tolist(), np.cumsum(cell_counts).tolist()
+        for (column, row), end, count in zip(cells.tolist(), ends, cell_counts.tolist()):
+            spatial_hash.cells[column, row] = [(rects[index], None) for index in rect_indices[end - count:end]]
+        return spatial_hash
@@ -0,0 +1,47 @@
+import pygame
+from collections import OrderedDict
+
+
+class TextRenderer:
+    """Text rendering with cached fonts and cached text surfaces"""
+
+    def __init__(self, max_surfaces=512):
+        self.max_surfaces = max_surfaces
+        self.fonts = {}  # (font name, size) -> pygame.font.Font
+        self.surfaces = OrderedDict()  # (text, font name, size, color) -> rendered surface (least recently used first)
+
+    def font(self, name, size):
+        """Get a system font, it is only loaded at the first request"""
+        key = (name, size)
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.SysFont(name, size)
+        return self.fonts[key]
+
+    def render(self, text, name, size, color):
+        """Render a text (the result is cached, so it must not be modified)"""
+        key = (text, name, size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font(name, size).render(text, 1, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_surfaces:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def render_runs(self, runs, name, size, color, position):
+        """Render a line made of several text runs, e.g. ["FPS: ", "60"], as (surface, (x, y)) pieces
+
+        Every run is cached on its own, so when only the value changes the labels are not rendered again.
+        """
+        x, y = position
+        pieces = []
+        for run in runs:
+            surface = self.render(run, name, size, color)
+            pieces.append((surface, (x, y)))
+            x += surface.get_width()
+        return pieces
+
+
+TEXT = TextRenderer()
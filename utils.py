@@ -1,5 +1,96 @@
 import pygame
 import numpy as np
+from collections import OrderedDict
+from assets import ASSETS, display_format
+from trigonometry import direction
+
+
+class TransformCache:
+    """Bounded LRU cache of scaled and rotated surfaces
+
+    The pinned (pre-baked) surfaces count towards the memory cap too, the cached ones share what is left of it.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._surfaces = OrderedDict()
+        self._pinned = {}  # pre-baked surfaces (e.g. from the sprite atlas), these are never evicted
+        self.pinned_bytes = 0
+
+    def pin(self, surfaces):
+        """Add pre-baked {(image path, size, rotation): surface} entries to the cache (as many as the cap allows)
+
+        Returns the number of pinned entries, the rest is transformed and cached on demand as usual.
+        """
+        pinned = 0
+        for key, surface in surfaces.items():
+            size = surface_bytes(surface)
+            if key in self._pinned or self.pinned_bytes + size > self.max_bytes:
+                continue
+            self._pinned[key] = surface
+            self.pinned_bytes += size
+            pinned += 1
+        self.evict()
+        return pinned
+
+    def get(self, img, size, rotation):
+        """Get the transformed image from the cache or create (and store) it"""
+        # rotations are quantized to whole degrees so the same pose always gives the same key:
+        key = (img, int(size), int(round(rotation)) % 360)
+        surface = self._pinned.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        # transform the display format version of the image, so the result is in the display format too:
+        surface = rotate_around_center(pygame.transform.scale(display_format(img), (key[1], key[1])), key[2])
+        self._surfaces[key] = surface
+        self.bytes += surface_bytes(surface)
+        self.evict()
+        return surface
+
+    def evict(self):
+        """Drop the least recently used cached surfaces while the cache is over the memory cap"""
+        while self.bytes + self.pinned_bytes > self.max_bytes and len(self._surfaces) > 1:
+            _, evicted = self._surfaces.popitem(last=False)
+            self.bytes -= surface_bytes(evicted)
+            self.evictions += 1
+
+    def discard(self, img):
+        """Drop the cached (not pinned) transformed versions of an image (e.g. when the image is unloaded)"""
+        for key in [key for key in self._surfaces if key[0] == img]:
+            self.bytes -= surface_bytes(self._surfaces.pop(key))
+
+    def clear(self):
+        """Drop every cached (not pinned) surface and reset the counters"""
+        self._surfaces.clear()
+        self.bytes = self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Hit/miss counters and memory usage of the cache"""
+        return {"entries": len(self._surfaces), "pinned": len(self._pinned), "bytes": self.bytes + self.pinned_bytes,
+                "pinned_bytes": self.pinned_bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+TRANSFORM_CACHE = TransformCache()
+ASSETS.unload_hooks.append(TRANSFORM_CACHE.discard)  # the transformed versions of an unloaded image go with it
+
+
+def surface_bytes(surface):
+    """Memory used by the pixels of a surface (only its own pixels for a subsurface, e.g. an atlas frame)"""
+    if surface.get_parent() is not None:
+        return surface.get_height() * surface.get_width() * surface.get_bytesize()
+    return surface.get_height() * surface.get_pitch()
 
 
 def rotate_around_center(image, angle):
@@ -12,8 +103,8 @@ def rotate_around_center(image, angle):
 
 
 def reshape_and_rotate(img, size, rotation):
-    """Reshape and rotate an image around the center"""
-    return rotate_around_center(pygame.transform.scale(img, (size, size)), rotation)
+    """Reshape and rotate an image around the center (the result is cached, so it must not be modified)"""
+    return TRANSFORM_CACHE.get(img, size, rotation)
 
 
 def get_distance_and_angle(obj1, obj2):
@@ -23,8 +114,7 @@ def get_distance_and_angle(obj1, obj2):
     c_x, c_y = obj2.rect.centerx, obj2.rect.centery  # C: obj2 location
     distance_ac = np.sqrt((a_x - c_x)**2 + (a_y - c_y)**2)  # distance between obj1 and obj2
     # generate an auxiliary point B at the direction of obj2 rotation with distance 100 from C:
-    x_delta = -np.sin(obj2.rotation * np.pi / 180) * 100
-    y_delta = -np.cos(obj2.rotation * np.pi / 180) * 100
+    x_delta, y_delta = direction(obj2.rotation, 100)
     b_x, b_y = c_x + x_delta, c_y + y_delta  # B
     distance_bc = 100
     distance_ab = np.sqrt((a_x - b_x)**2 + (a_y - b_y)**2)
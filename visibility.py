@@ -0,0 +1,95 @@
+import pygame
+import numpy as np
+import os
+import hashlib
+import zipfile
+
+# the cache files, one per set of obstacles and grid settings (so every level keeps its own):
+VISIBILITY_CACHE_PATH = os.path.join("Assets", "visibility_cache_{key}.npz")
+
+
+class VisibilityGrid:
+    """Precomputed line of sight between the cells of a coarse grid over the level
+
+    For every cell the visibility of the cells within the view distance is stored, a line of sight query is a table
+    lookup. Points further away than the view distance (plus a cell) are never visible. The table is built from the
+    obstacles when the level is loaded and cached on disk, keyed by a hash of the obstacles and the grid settings.
+    """
+
+    def __init__(self, obstacles, width, height, cell_size=20, view_distance=140, step=4,
+                 cache_path=VISIBILITY_CACHE_PATH):
+        self.cell_size, self.step = cell_size, step
+        self.columns, self.rows = -(-width // cell_size), -(-height // cell_size)
+        self.radius = view_distance // cell_size + 1  # the largest cell offset we need to know about
+        obstacles = [pygame.Rect(obstacle) for obstacle in obstacles]
+        self.key = hashlib.sha1(repr(([tuple(obstacle) for obstacle in obstacles], width, height, cell_size,
+                                      self.radius, step)).encode()).hexdigest()
+
+        self.table = None
+        if cache_path is not None:
+            cache_path = cache_path.format(key=self.key[:16])
+            self.table = self.load_cached(cache_path)
+        if self.table is None:
+            self.table = self.build(obstacles, width, height)
+            if cache_path is not None:
+                try:
+                    # written next to it and moved into place, so an interrupted write never leaves a truncated cache:
+                    with open(cache_path + ".tmp", "wb") as cache_file:
+                        np.savez_compressed(cache_file, key=self.key, table=self.table)
+                    os.replace(cache_path + ".tmp", cache_path)
+                except OSError:
+                    pass  # the cache is best effort (e.g. a read-only install), the table is built every time then
+
+    def load_cached(self, cache_path):
+        """The table from the cache file if it was built for the same key (None otherwise)"""
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path) as cached:
+                return cached["table"] if str(cached["key"]) == self.key else None
+        except (ValueError, OSError, KeyError, EOFError, zipfile.BadZipFile):
+            return None  # not a visibility cache (e.g. a truncated file), the table is built again
+
+    def build(self, obstacles, width, height):
+        """Raycast between the centers of every cell and its neighbouring cells within the radius"""
+        blocked = np.zeros((height, width), dtype=bool)
+        for obstacle in obstacles:
+            obstacle = obstacle.clip(0, 0, width, height)
+            blocked[obstacle.top:obstacle.bottom, obstacle.left:obstacle.right] = True
+
+        rows, columns = np.meshgrid(np.arange(self.rows), np.arange(self.columns), indexing="ij")
+        size = 2 * self.radius + 1
+        table = np.zeros((self.rows, self.columns, size, size), dtype=bool)
+        # sample points along the rays (the parts in the start and the end cells are not checked, so characters
+        # standing right next to an obstacle are not hidden by it):
+        samples = int(np.ceil(np.sqrt(2) * self.radius * self.cell_size / self.step))
+        t = (np.arange(samples) + 0.5) / samples
+        # the visibility is symmetric, so only the offsets in one half are raycast and the other half is mirrored:
+        for row_offset in range(0, self.radius + 1):
+            for column_offset in range(-self.radius if row_offset > 0 else 0, self.radius + 1):
+                target_rows, target_columns = rows + row_offset, columns + column_offset
+                inside = (target_rows >= 0) & (target_rows < self.rows) & \
+                    (target_columns >= 0) & (target_columns < self.columns)
+                x = (columns[..., None] + 0.5 + column_offset * t) * self.cell_size
+                y = (rows[..., None] + 0.5 + row_offset * t) * self.cell_size
+                sample_columns, sample_rows = (x // self.cell_size).astype(int), (y // self.cell_size).astype(int)
+                checked = ~(((sample_columns == columns[..., None]) & (sample_rows == rows[..., None])) |
+                            ((sample_columns == target_columns[..., None]) & (sample_rows == target_rows[..., None])))
+                hit = blocked[np.clip(y.astype(int), 0, height - 1), np.clip(x.astype(int), 0, width - 1)] & checked
+                visible = inside & ~hit.any(axis=-1)
+                table[:, :, row_offset + self.radius, column_offset + self.radius] = visible
+                mirrored = np.zeros_like(visible)
+                mirrored[target_rows[visible], target_columns[visible]] = True
+                table[:, :, self.radius - row_offset, self.radius - column_offset] = mirrored
+        return table
+
+    def visible(self, x_1, y_1, x_2, y_2):
+        """Check if (x_2, y_2) can be seen from (x_1, y_1), works with scalars and NumPy arrays too"""
+        column_1 = np.clip(np.asarray(x_1) // self.cell_size, 0, self.columns - 1).astype(int)
+        row_1 = np.clip(np.asarray(y_1) // self.cell_size, 0, self.rows - 1).astype(int)
+        column_offset = np.clip(np.asarray(x_2) // self.cell_size, 0, self.columns - 1).astype(int) - column_1
+        row_offset = np.clip(np.asarray(y_2) // self.cell_size, 0, self.rows - 1).astype(int) - row_1
+        near = (np.abs(column_offset) <= self.radius) & (np.abs(row_offset) <= self.radius)
+        column_offset = np.clip(column_offset, -self.radius, self.radius) + self.radius
+        row_offset = np.clip(row_offset, -self.radius, self.radius) + self.radius
+        return near & self.table[row_1, column_1, row_offset, column_offset]
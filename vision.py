@@ -0,0 +1,119 @@
+import pygame
+import numpy as np
+from spatial import SpatialHash
+from utils import get_distance_and_angle
+from trigonometry import direction_array
+
+
+def distances_and_angles(x, y, c_x, c_y, rotations):
+    """Distance and angle of (x, y) points from (c_x, c_y) guards looking at the given rotations
+
+    The same cosine law as utils.get_distance_and_angle, but it works with NumPy arrays.
+    """
+    a_x, a_y = x, y  # A: the point
+    distance_ac = np.sqrt((a_x - c_x)**2 + (a_y - c_y)**2)
+    # auxiliary points B at the direction of the guard rotations with distance 100 from C:
+    x_delta, y_delta = direction_array(rotations, 100)
+    b_x, b_y = c_x + x_delta, c_y + y_delta
+    distance_bc = 100
+    distance_ab = np.sqrt((a_x - b_x)**2 + (a_y - b_y)**2)
+    # cosine law (the angle is nan for a guard standing exactly at the point, that is never a detection):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        angle = np.arccos((distance_bc**2 + distance_ac**2 - distance_ab**2) /
+                          (2 * distance_bc * distance_ac)) * 180 / np.pi
+    return distance_ac, angle
+
+
+class GuardVision:
+    """Vision of all guards evaluated together with NumPy arrays
+
+    The guard centers, rotations and states are gathered from the entity store and the distance and the cosine law
+    angle are computed for every moving guard in one vectorized pass. Guards which never move or rotate get a
+    precomputed view mask instead, so checking them is a single lookup.
+    With a visibility grid the guards cannot see through the obstacles either.
+    """
+
+    def __init__(self, view_distance=140, view_angle=80, visibility=None):
+        self.view_distance, self.view_angle, self.visibility = view_distance, view_angle, visibility
+        self.view_masks = {}  # static guard -> (left, top, boolean bitmap of the seen points)
+        self.centers = np.zeros((0, 2))
+        self.rotations = np.zeros(0)
+        self.watching = np.zeros(0, dtype=bool)  # alive and not being killed
+        self.masked = np.zeros(0, dtype=bool)  # has a view mask
+        self.guards = []
+        self.indices = np.zeros(0, dtype=int)  # rows of the guards in their entity store
+
+    def build_view_masks(self, guards):
+        """Precompute the view masks of the static guards (at level load)"""
+        for guard in guards:
+            if guard.static:
+                c_x, c_y = guard.rect.center
+                left, top = c_x - self.view_distance, c_y - self.view_distance
+                y, x = np.mgrid[top:top + 2 * self.view_distance + 1, left:left + 2 * self.view_distance + 1]
+                distance, angle = distances_and_angles(x, y, float(c_x), float(c_y), float(guard.rotation))
+                mask = (distance < self.view_distance) & (angle < self.view_angle)
+                if self.visibility is not None:
+                    mask &= self.visibility.visible(c_x, c_y, x, y)
+                self.view_masks[guard] = (left, top, mask)
+
+    def update(self, guards):
+        """Gather the current state of the guards from their entity store columns"""
+        if guards is not self.guards:
+            self.guards = guards
+            self.indices = np.array([guard.entity_id for guard in guards], dtype=int)
+            self.masked = np.array([guard in self.view_masks for guard in guards], dtype=bool)
+        if not guards:
+            return
+        store = guards[0].store
+        self.centers = np.stack(store.centers(self.indices), axis=1).astype(float)
+        self.rotations = store.columns["rotation"][self.indices]
+        self.watching = store.columns["alive"][self.indices] & np.isnan(store.columns["killed_at"][self.indices])
+
+    def mask_lookup(self, guard, x, y):
+        """Check if a static guard sees the (x, y) point using its view mask"""
+        left, top, mask = self.view_masks[guard]
+        column, row = int(x) - left, int(y) - top
+        return 0 <= row < mask.shape[0] and 0 <= column < mask.shape[1] and bool(mask[row, column])
+
+    def detect(self, x, y):
+        """Boolean mask of the guards which see the (x, y) point"""
+        seen = np.zeros(len(self.guards), dtype=bool)
+        moving = np.flatnonzero(self.watching & ~self.masked)
+        if len(moving):
+            distance, angle = distances_and_angles(x, y, self.centers[moving, 0], self.centers[moving, 1],
+                                                   self.rotations[moving])
+            seen[moving] = (distance < self.view_distance) & (angle < self.view_angle)
+            if self.visibility is not None and seen.any():
+                seen[moving] &= self.visibility.visible(self.centers[moving, 0], self.centers[moving, 1], x, y)
+        for index in np.flatnonzero(self.watching & self.masked):
+            seen[index] = self.mask_lookup(self.guards[index], x, y)
+        return seen
+
+    def sees_dead_body(self, guards, active=None):
+        """Check if any watching guard sees a dead (or being killed) guard
+
+        The bodies are indexed in a spatial hash with view distance sized cells, so every guard only tests the bodies
+        around it instead of all the other guards. update must be called with the same guards before.
+        With an active boolean mask only those guards look around (the ones the AI scheduler updated).
+        """
+        bodies = SpatialHash(cell_size=self.view_distance)
+        for guard in guards:
+            if guard.killed_at is not None:
+                bodies.insert(pygame.Rect(guard.rect.center, (1, 1)), guard)
+        if not bodies.cells:
+            return False
+        view_area = pygame.Rect(0, 0, 2 * self.view_distance, 2 * self.view_distance)
+        watching = self.watching if active is None else self.watching & active
+        for index in np.flatnonzero(watching):
+            guard = guards[index]
+            view_area.center = guard.rect.center
+            for _, body in bodies.query(view_area):
+                if self.masked[index]:
+                    if self.mask_lookup(guard, *body.rect.center):
+                        return True
+                    continue
+                distance, angle = get_distance_and_angle(body, guard)
+                if distance < self.view_distance and angle < self.view_angle and \
+                        (self.visibility is None or self.visibility.visible(*guard.rect.center, *body.rect.center)):
+                    return True
+        return False